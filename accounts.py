@@ -0,0 +1,141 @@
+"""
+Several bol seller accounts in one process, synced concurrently into one order store.
+
+    python accounts.py --accounts accounts.json            # one run
+    python accounts.py --accounts accounts.json --loop 300  # every 5 minutes
+
+accounts.json lists the accounts:
+
+    [{"name": "shop-nl", "client_id": "...", "client_secret": "..."},
+     {"name": "shop-be", "client_id": "...", "client_secret": "..."}]
+
+Every run prints one line of JSON per account with its statistics.
+"""
+
+import argparse
+import contextlib
+import json
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from http.cookiejar import DefaultCookiePolicy
+
+from requests.adapters import HTTPAdapter
+
+from cache import ProductCache
+from client import Client, new_session
+from export import OrderExport
+from ratelimit import RequestScheduler
+from store import OrderStore
+from sync import SyncEngine, add_arguments, run_forever
+
+
+def load_accounts(path):
+    """Read a list of {"name", "client_id", "client_secret"} dicts from a JSON file."""
+
+    with open(path, "r") as f:
+        accounts = json.load(f)
+    for account in accounts:
+        missing = {"name", "client_id", "client_secret"} - set(account)
+        if missing:
+            raise ValueError("Account %r in %s misses %s" % (account.get("name"), path, ", ".join(sorted(missing))))
+    return accounts
+
+
+class AccountManager(object):
+    """Syncs several seller accounts into one OrderStore, all at the same time.
+
+    The accounts share one HTTP session, so one connection pool, and the
+    product cache: titles and brands don't depend on the account. Each
+    account has its own Client with its own token and RequestScheduler, as
+    bol's rate limits are per account. Items are stored tagged with the
+    account's name.
+    """
+
+    def __init__(self, store, pool_size=10, token_file=None, demo=False, base_url=None, token_url=None,
+                 product_cache=None, full=False, export=None):
+        """pool_size is the number of pooled connections per account; the
+        other arguments are passed to every Client and SyncEngine."""
+
+        self.store = store
+        self.pool_size = pool_size
+        self.token_file = token_file
+        self.demo = demo
+        self.base_url = base_url
+        self.token_url = token_url
+        self.full = full
+        self.export = export
+        self.product_cache = product_cache if product_cache is not None else ProductCache()
+        self.session = new_session(pool_size)
+        # a login clears the cookies, which would log out the other accounts; bol doesn't need them
+        self.session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+        self.engines = {}
+
+    def add(self, name, client_id, client_secret):
+        """Add an account, returning its Client."""
+
+        if name in self.engines:
+            raise ValueError("Account %r was already added" % name)
+        client = Client(client_id, client_secret, demo=self.demo, product_cache=self.product_cache,
+                        token_file=self.token_file, scheduler=RequestScheduler(), login=False,
+                        base_url=self.base_url, token_url=self.token_url, session=self.session)
+        self.engines[name] = SyncEngine(client, self.store, full=self.full, account=name, export=self.export)
+        self._resize_pool()
+        return client
+
+    def _resize_pool(self):
+        # the enrich workers of every account use the pool at the same time
+        size = self.pool_size * max(1, len(self.engines))
+        self.session.mount('https://', HTTPAdapter(pool_connections=size, pool_maxsize=size))
+        self.session.mount('http://', HTTPAdapter(pool_connections=size, pool_maxsize=size))
+
+    def client(self, name):
+        return self.engines[name].client
+
+    def run_once(self):
+        """Sync every account at the same time, returning {name: statistics}."""
+
+        if not self.engines:
+            return {}
+        with ThreadPoolExecutor(len(self.engines)) as pool:
+            futures = {name: pool.submit(engine.run_once) for name, engine in self.engines.items()}
+            return {name: future.result() for name, future in futures.items()}
+
+    def run_forever(self, interval, report=None):
+        """Sync every interval seconds, passing the statistics of each run to report."""
+
+        run_forever(self.run_once, interval, report)
+
+
+def _print_stats(stats):
+    for name, account_stats in stats.items():
+        print(json.dumps(dict(account_stats, account=name)), flush=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sync the open bol.com orders of several accounts into one order store.")
+    parser.add_argument("--accounts", default="accounts.json", help="account list (default accounts.json)")
+    add_arguments(parser)
+    args = parser.parse_args(argv)
+    try:
+        accounts = load_accounts(args.accounts)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+
+    export = OrderExport(args.export) if args.export else None
+    manager = AccountManager(OrderStore(args.db), token_file=args.token_file, demo=args.demo, full=args.full,
+                             export=export)
+    with contextlib.redirect_stdout(sys.stderr):
+        for account in accounts:
+            manager.add(account["name"], account["client_id"], account["client_secret"])
+    if args.loop:
+        try:
+            manager.run_forever(args.loop, _print_stats)
+        except KeyboardInterrupt:
+            return 0
+    stats = manager.run_once()
+    _print_stats(stats)
+    return 1 if any('error' in account_stats for account_stats in stats.values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,9 +1,26 @@
+import time
+_STARTED = time.perf_counter()  # Voor het opstartprofiel, zo vroeg mogelijk
+
 import tkinter as tk
-from tkinter import ttk
 import customtkinter as ctk
 import csv
+import queue
+import sys
+import threading
 from datetime import datetime
-from client import Client  # Gebruik de juiste import
+from client import Client, is_problem  # Gebruik de juiste import
+from delta import DeltaRefresh
+from enrich import OrderEnricher
+from export import OrderExport
+from metrics import RequestMetrics
+from models import Address, Order
+from offers import OfferExport, article_row
+from refresh import CANCELLED, DONE, ERROR, ROW, OfferExportWorker, RefreshWorker
+from search import SearchIndex, matches, query_terms
+from startup import StartupProfile
+from store import CSV_ENCODING, CSV_HEADER, OrderStore
+from virtualtree import ListModel, StoreModel, VirtualTreeview
+_IMPORTED = time.perf_counter()
 
 # Kleuren uit de afbeelding
 LIGHT_BLUE = "#7EDDD8"
@@ -12,11 +29,24 @@ DARK_BLUE_GREEN = "#005F61"
 WHITE = "#FFFFFF"
 BLACK = "#000000"
 
+AUTO_REFRESH_MINUTES = [0, 1, 5, 15]  # 0 = uit
+DRAIN_INTERVAL_MS = 100  # Hoe vaak de refresh-queue wordt geleegd
+DRAIN_BATCH = 200  # Maximaal aantal rijen per keer, zodat de UI blijft reageren
+SEARCH_DEBOUNCE_MS = 250  # Pas zoeken als er even niet getypt wordt
+METRICS_INTERVAL_MS = 1000  # Verversen van de API-statistieken op Tab1
+
 class SalesOrderDashboard(ctk.CTk):
-    def __init__(self, client):
+    def __init__(self, client, store=None, fast_start=False, profile=None, export=None):
+        """With fast_start the window is shown before the local orders are
+        loaded and the first refresh starts. Pass a StartupProfile as profile to
+        have it printed when the first refresh ends, and an export.OrderExport
+        as export to have new orders exported as they come in."""
         super().__init__()
 
         self.client = client
+        self.store = store if store is not None else OrderStore()
+        self.export = export
+        self.enricher = OrderEnricher(client, warn=self.warn)
         self.translations = {
             'en': {
                 'title': "Sales Order Dashboard",
@@ -42,7 +72,22 @@ class SalesOrderDashboard(ctk.CTk):
                 'billing_address': "Billing Address",
                 'billing_city': "Billing City",
                 'billing_postal_code': "Billing Postal Code",
-                'billing_country': "Billing Country"
+                'billing_country': "Billing Country",
+                'cancel': "Cancel",
+                'auto_refresh': "Auto refresh",
+                'off': "Off",
+                'minutes': "{} min",
+                'items_loaded': "{} items loaded",
+                'refresh_cancelled': "Refresh cancelled, {} items loaded",
+                'refresh_failed': "Failed to load orders: {}",
+                'filter_matches': "Only matches",
+                'show_closed': "Show shipped and cancelled",
+                'stock': "Stock",
+                'price': "Price",
+                'load_offers': "Load catalog",
+                'offers_loaded': "{} offers loaded",
+                'offers_failed': "Failed to load offers: {}",
+                'api_metrics': "API statistics"
             },
             'nl': {
                 'title': "Verkooporder Dashboard",
@@ -68,7 +113,22 @@ class SalesOrderDashboard(ctk.CTk):
                 'billing_address': "Factuur Adres",
                 'billing_city': "Factuur Stad",
                 'billing_postal_code': "Factuur Postcode",
-                'billing_country': "Factuur Land"
+                'billing_country': "Factuur Land",
+                'cancel': "Annuleren",
+                'auto_refresh': "Automatisch vernieuwen",
+                'off': "Uit",
+                'minutes': "{} min",
+                'items_loaded': "{} items geladen",
+                'refresh_cancelled': "Vernieuwen geannuleerd, {} items geladen",
+                'refresh_failed': "Orders laden mislukt: {}",
+                'filter_matches': "Alleen resultaten",
+                'show_closed': "Toon verzonden en geannuleerd",
+                'stock': "Voorraad",
+                'price': "Prijs",
+                'load_offers': "Catalogus laden",
+                'offers_loaded': "{} aanbiedingen geladen",
+                'offers_failed': "Aanbiedingen laden mislukt: {}",
+                'api_metrics': "API-statistieken"
             },
             'de': {
                 'title': "Verkaufsauftrag Dashboard",
@@ -94,7 +154,22 @@ class SalesOrderDashboard(ctk.CTk):
                 'billing_address': "Rechnungsadresse",
                 'billing_city': "Rechnungsstadt",
                 'billing_postal_code': "Rechnungspostleitzahl",
-                'billing_country': "Rechnungsland"
+                'billing_country': "Rechnungsland",
+                'cancel': "Abbrechen",
+                'auto_refresh': "Automatisch aktualisieren",
+                'off': "Aus",
+                'minutes': "{} Min",
+                'items_loaded': "{} Artikel geladen",
+                'refresh_cancelled': "Aktualisierung abgebrochen, {} Artikel geladen",
+                'refresh_failed': "Bestellungen laden fehlgeschlagen: {}",
+                'filter_matches': "Nur Treffer",
+                'show_closed': "Versandte und stornierte anzeigen",
+                'stock': "Bestand",
+                'price': "Preis",
+                'load_offers': "Katalog laden",
+                'offers_loaded': "{} Angebote geladen",
+                'offers_failed': "Angebote laden fehlgeschlagen: {}",
+                'api_metrics': "API-Statistiken"
             }
         }
 
@@ -104,10 +179,36 @@ class SalesOrderDashboard(ctk.CTk):
         self.geometry("1024x768")
         self.configure(bg=BLUE_GREEN)
 
-        self.create_widgets()
-        self.load_orders_from_csv()  # Laad orders bij het opstarten
+        self.refresh_messages = queue.Queue()
+        self.refresh_worker = None
+        self.auto_refresh_minutes = 0
+        self.auto_refresh_job = None
+        self.search_jobs = {}
+        self.last_searches = {}
+        self.search_indexes = {}
+        self.offer_messages = queue.Queue()
+        self.offer_worker = None
+        self.print_profile = profile is not None
+        self.profile = profile if profile is not None else StartupProfile()
+        self.bind("<Map>", self.on_map, add="+")
+
+        with self.profile.phase('widgets'):
+            self.create_widgets()
+            self.update_translations()
+        if fast_start:
+            # Eerst het venster tekenen, daarna pas de store en het netwerk
+            self.after_idle(lambda: self.after(0, self.start_up))
+        else:
+            self.start_up()
+
+    def start_up(self):
+        with self.profile.phase('local_load'):
+            self.load_orders_from_csv()  # Laad orders bij het opstarten
         self.load_orders()
-        self.update_translations()
+
+    def on_map(self, event):
+        if event.widget is self:
+            self.profile.mark('window_shown')
 
     def set_language(self, lang):
         self.current_language = lang
@@ -133,7 +234,7 @@ class SalesOrderDashboard(ctk.CTk):
         self.language_menu.pack(side=tk.RIGHT, padx=5, pady=5)
 
         self.frames = {}
-        
+
         self.orders_frame = ctk.CTkFrame(self, fg_color=LIGHT_BLUE)
         self.articles_frame = ctk.CTkFrame(self, fg_color=LIGHT_BLUE)
         self.messages_frame = ctk.CTkFrame(self, fg_color=LIGHT_BLUE)
@@ -146,18 +247,25 @@ class SalesOrderDashboard(ctk.CTk):
         self.frames["tab1"] = self.tab1_frame
         self.frames["tab2"] = self.tab2_frame
 
-        for frame in self.frames.values():
-            frame.pack(fill=tk.BOTH, expand=True)
-
-        self.create_orders_tab()
-        self.create_articles_tab()
-        self.create_messages_tab()
-        self.create_tab1()
-        self.create_tab2()
+        # Tabs worden pas opgebouwd als ze voor het eerst getoond worden
+        self.tab_builders = {
+            self.orders_frame: (self.create_orders_tab, self.translate_orders_tab),
+            self.articles_frame: (self.create_articles_tab, self.translate_articles_tab),
+            self.messages_frame: (self.create_messages_tab, self.translate_messages_tab),
+            self.tab1_frame: (self.create_tab1, None),
+            self.tab2_frame: (self.create_tab2, None),
+        }
+        self.built_tabs = set()
 
         self.show_frame(self.orders_frame)  # Toon standaard de Orders-tab
 
     def show_frame(self, frame):
+        if frame not in self.built_tabs:
+            self.built_tabs.add(frame)
+            create, translate = self.tab_builders[frame]
+            create()
+            if translate is not None:
+                translate()
         for f in self.frames.values():
             f.pack_forget()
         frame.pack(fill=tk.BOTH, expand=True)
@@ -170,13 +278,24 @@ class SalesOrderDashboard(ctk.CTk):
         self.orders_button.configure(text=self.translations[self.current_language]['order_id'])
         self.articles_button.configure(text=self.translations[self.current_language]['product_name'])
         self.messages_button.configure(text=self.translations[self.current_language]['product_name'])
-        self.tab1_button.configure(text="Tab1")
+        self.tab1_button.configure(text=self.translations[self.current_language]['api_metrics'])
         self.tab2_button.configure(text="Tab2")
         self.language_menu.set(self.translations[self.current_language]['language'])
+        for frame in self.built_tabs:
+            translate = self.tab_builders[frame][1]
+            if translate is not None:
+                translate()
+
+    def translate_orders_tab(self):
         self.orders_search_entry.configure(placeholder_text=self.translations[self.current_language]['search'])
-        self.articles_search_entry.configure(placeholder_text=self.translations[self.current_language]['search'])
-        self.messages_search_entry.configure(placeholder_text=self.translations[self.current_language]['search'])
+        self.orders_filter_check.configure(text=self.translations[self.current_language]['filter_matches'])
+        self.show_closed_check.configure(text=self.translations[self.current_language]['show_closed'])
         self.refresh_button.configure(text=self.translations[self.current_language]['refresh'])
+        self.cancel_button.configure(text=self.translations[self.current_language]['cancel'])
+        self.auto_refresh_label.configure(text=self.translations[self.current_language]['auto_refresh'])
+        auto_refresh_labels = self.auto_refresh_labels()
+        self.auto_refresh_menu.configure(values=auto_refresh_labels)
+        self.auto_refresh_menu.set(auto_refresh_labels[AUTO_REFRESH_MINUTES.index(self.auto_refresh_minutes)])
         
         # Update treeview headings
         self.orders_tree.heading("SO ID", text=self.translations[self.current_language]['order_id'])
@@ -187,10 +306,19 @@ class SalesOrderDashboard(ctk.CTk):
         self.orders_tree.heading("Brand", text=self.translations[self.current_language]['brand'])
         self.orders_tree.heading("Fulfilment Method", text=self.translations[self.current_language]['fulfilment_method'])
 
+    def translate_articles_tab(self):
+        self.articles_search_entry.configure(placeholder_text=self.translations[self.current_language]['search'])
+        self.articles_filter_check.configure(text=self.translations[self.current_language]['filter_matches'])
         self.articles_tree.heading("EAN", text=self.translations[self.current_language]['ean'])
         self.articles_tree.heading("Product Name", text=self.translations[self.current_language]['product_name'])
         self.articles_tree.heading("Brand", text=self.translations[self.current_language]['brand'])
+        self.articles_tree.heading("Stock", text=self.translations[self.current_language]['stock'])
+        self.articles_tree.heading("Price", text=self.translations[self.current_language]['price'])
+        self.offers_button.configure(text=self.translations[self.current_language]['load_offers'])
 
+    def translate_messages_tab(self):
+        self.messages_search_entry.configure(placeholder_text=self.translations[self.current_language]['search'])
+        self.messages_filter_check.configure(text=self.translations[self.current_language]['filter_matches'])
         self.messages_tree.heading("Order ID", text=self.translations[self.current_language]['order_id'])
         self.messages_tree.heading("Name", text=self.translations[self.current_language]['product_name'])  # Gebruik product_name voor 'Naam'
 
@@ -199,8 +327,16 @@ class SalesOrderDashboard(ctk.CTk):
         self.orders_search_entry = ctk.CTkEntry(self.orders_frame, textvariable=self.orders_search_var, placeholder_text=self.translations[self.current_language]['search'], fg_color=WHITE, text_color=BLACK)
         self.orders_search_entry.pack(pady=10)
         self.orders_search_entry.bind("<KeyRelease>", self.search_orders)
-
-        self.orders_tree = ttk.Treeview(self.orders_frame, columns=("SO ID", "Order Date", "EAN", "Quantity", "Product Name", "Brand", "Fulfilment Method", "Customer Name", "Customer Address", "City", "Postal Code", "Country"), show="headings")
+        self.orders_search_entry.bind("<Return>", lambda event: self.jump_to(self.orders_tree, self.orders_search_var, self.orders_filter_var))
+        self.orders_filter_var = tk.BooleanVar(value=False)
+        self.orders_filter_check = ctk.CTkCheckBox(self.orders_frame, text=self.translations[self.current_language]['filter_matches'], variable=self.orders_filter_var, command=lambda: self.search_orders(None), text_color=BLACK)
+        self.orders_filter_check.pack()
+        self.show_closed_var = tk.BooleanVar(value=False)
+        self.show_closed_check = ctk.CTkCheckBox(self.orders_frame, text=self.translations[self.current_language]['show_closed'], variable=self.show_closed_var, command=self.toggle_closed, text_color=BLACK)
+        self.show_closed_check.pack(pady=5)
+
+        self.orders_model = StoreModel(self.store, open_only=True)  # Alleen de zichtbare rijen worden uit de store gelezen
+        self.orders_tree = VirtualTreeview(self.orders_frame, self.orders_model, columns=("SO ID", "Order Date", "EAN", "Quantity", "Product Name", "Brand", "Fulfilment Method", "Customer Name", "Customer Address", "City", "Postal Code", "Country"), show="headings")
         self.orders_tree.heading("SO ID", text=self.translations[self.current_language]['order_id'])
         self.orders_tree.heading("Order Date", text=self.translations[self.current_language]['order_date'])
         self.orders_tree.heading("EAN", text=self.translations[self.current_language]['ean'])
@@ -217,8 +353,45 @@ class SalesOrderDashboard(ctk.CTk):
         self.orders_tree.pack(fill=tk.BOTH, expand=True)
         self.orders_tree.bind("<Double-1>", self.on_order_click)
 
-        self.refresh_button = ctk.CTkButton(self.orders_frame, text=self.translations[self.current_language]['refresh'], command=self.load_orders, fg_color=DARK_BLUE_GREEN, text_color=WHITE)
-        self.refresh_button.pack(pady=10)
+        self.refresh_bar = ctk.CTkFrame(self.orders_frame, fg_color=LIGHT_BLUE)
+        self.refresh_bar.pack(fill=tk.X, pady=10)
+        self.refresh_button = ctk.CTkButton(self.refresh_bar, text=self.translations[self.current_language]['refresh'], command=self.load_orders, fg_color=DARK_BLUE_GREEN, text_color=WHITE)
+        self.refresh_button.pack(side=tk.LEFT, padx=5)
+        self.cancel_button = ctk.CTkButton(self.refresh_bar, text=self.translations[self.current_language]['cancel'], command=self.cancel_refresh, state="disabled", fg_color=DARK_BLUE_GREEN, text_color=WHITE)
+        self.cancel_button.pack(side=tk.LEFT, padx=5)
+        self.refresh_progress = ctk.CTkProgressBar(self.refresh_bar, mode="indeterminate", progress_color=DARK_BLUE_GREEN)
+        self.refresh_progress.set(0)
+        self.refresh_progress.pack(side=tk.LEFT, padx=5, fill=tk.X, expand=True)
+        self.refresh_status = ctk.CTkLabel(self.refresh_bar, text="", text_color=BLACK)
+        self.refresh_status.pack(side=tk.LEFT, padx=5)
+
+        self.auto_refresh_menu = ctk.CTkOptionMenu(self.refresh_bar, values=self.auto_refresh_labels(), command=self.change_auto_refresh, fg_color=DARK_BLUE_GREEN, text_color=WHITE)
+        self.auto_refresh_menu.pack(side=tk.RIGHT, padx=5)
+        self.auto_refresh_label = ctk.CTkLabel(self.refresh_bar, text=self.translations[self.current_language]['auto_refresh'], text_color=BLACK)
+        self.auto_refresh_label.pack(side=tk.RIGHT, padx=5)
+
+    def toggle_closed(self):
+        """Show or hide the items that are no longer open (shipped or cancelled)."""
+        self.orders_model.set_open_only(not self.show_closed_var.get())
+        self.orders_tree.first = 0
+        self.orders_tree.refresh()
+
+    def auto_refresh_labels(self):
+        labels = [self.translations[self.current_language]['off']]
+        labels.extend(self.translations[self.current_language]['minutes'].format(minutes) for minutes in AUTO_REFRESH_MINUTES[1:])
+        return labels
+
+    def change_auto_refresh(self, choice):
+        self.auto_refresh_minutes = AUTO_REFRESH_MINUTES[self.auto_refresh_labels().index(choice)]
+        if self.auto_refresh_job is not None:
+            self.after_cancel(self.auto_refresh_job)
+            self.auto_refresh_job = None
+        self.schedule_auto_refresh()
+
+    def schedule_auto_refresh(self):
+        # Niet plannen terwijl er nog een refresh loopt, die plant zelf de volgende
+        if self.auto_refresh_minutes and self.refresh_worker is None:
+            self.auto_refresh_job = self.after(self.auto_refresh_minutes * 60 * 1000, self.load_orders)
 
     def on_order_click(self, event):
         selected_item = self.orders_tree.selection()
@@ -227,21 +400,14 @@ class SalesOrderDashboard(ctk.CTk):
             self.show_order_details(order_id)
 
     def show_order_details(self, order_id):
-        order_details = self.client._order(order_id)
-        shipment_details = order_details.get('shipmentDetails', {})
-        billing_details = order_details.get('billingDetails', {})
-
-        customer_name = f"{shipment_details.get('firstName', 'N/A')} {shipment_details.get('surname', 'N/A')}"
-        customer_address = f"{shipment_details.get('streetName', 'N/A')} {shipment_details.get('houseNumber', 'N/A')} {shipment_details.get('houseNumberExtension', 'N/A')}"
-        city = shipment_details.get('city', 'N/A')
-        postal_code = shipment_details.get('zipCode', 'N/A')
-        country = shipment_details.get('countryCode', 'N/A')
-
-        billing_name = f"{billing_details.get('firstName', 'N/A')} {billing_details.get('surname', 'N/A')}"
-        billing_address = f"{billing_details.get('streetName', 'N/A')} {billing_details.get('houseNumber', 'N/A')} {billing_details.get('houseNumberExtension', 'N/A')}"
-        billing_city = billing_details.get('city', 'N/A')
-        billing_postal_code = billing_details.get('zipCode', 'N/A')
-        billing_country = billing_details.get('countryCode', 'N/A')
+        details = self.client._order(order_id)  # Uit de cache als de order net is ververst
+        # een oude of geïmporteerde order kan een 404 geven; toon dan N/A
+        order = Order(order_id) if is_problem(details) else Order.from_json(details)
+        shipment = order.shipment or Address()
+        billing = order.billing or Address()
+
+        customer_name, customer_address, city, postal_code, country = shipment.customer_fields()
+        billing_name, billing_address, billing_city, billing_postal_code, billing_country = billing.customer_fields()
 
         details_window = ctk.CTkToplevel(self)
         details_window.title(self.translations[self.current_language]['order_id'] + ": " + order_id)
@@ -264,163 +430,334 @@ class SalesOrderDashboard(ctk.CTk):
         self.articles_search_entry = ctk.CTkEntry(self.articles_frame, textvariable=self.articles_search_var, placeholder_text=self.translations[self.current_language]['search'], fg_color=WHITE, text_color=BLACK)
         self.articles_search_entry.pack(pady=10)
         self.articles_search_entry.bind("<KeyRelease>", self.search_articles)
-
-        self.articles_tree = ttk.Treeview(self.articles_frame, columns=("EAN", "Product Name", "Brand"), show="headings")
+        self.articles_search_entry.bind("<Return>", lambda event: self.jump_to(self.articles_tree, self.articles_search_var, self.articles_filter_var))
+        self.articles_filter_var = tk.BooleanVar(value=False)
+        self.articles_filter_check = ctk.CTkCheckBox(self.articles_frame, text=self.translations[self.current_language]['filter_matches'], variable=self.articles_filter_var, command=lambda: self.search_articles(None), text_color=BLACK)
+        self.articles_filter_check.pack()
+
+        # Het aanbod van de laatste export, met titel en merk uit de productcache
+        cache = self.client.product_cache
+        infos = cache.infos()
+        self.articles_model = ListModel(article_row(offer, infos.get(offer['ean'])) for offer in cache.offers())
+        self.articles_tree = VirtualTreeview(self.articles_frame, self.articles_model, columns=("EAN", "Product Name", "Brand", "Stock", "Price"), show="headings")
         self.articles_tree.heading("EAN", text=self.translations[self.current_language]['ean'])
         self.articles_tree.heading("Product Name", text=self.translations[self.current_language]['product_name'])
         self.articles_tree.heading("Brand", text=self.translations[self.current_language]['brand'])
+        self.articles_tree.heading("Stock", text=self.translations[self.current_language]['stock'])
+        self.articles_tree.heading("Price", text=self.translations[self.current_language]['price'])
 
         self.articles_tree.pack(fill=tk.BOTH, expand=True)
 
+        self.offers_bar = ctk.CTkFrame(self.articles_frame, fg_color=LIGHT_BLUE)
+        self.offers_bar.pack(fill=tk.X, pady=10)
+        self.offers_button = ctk.CTkButton(self.offers_bar, text=self.translations[self.current_language]['load_offers'], command=self.load_offers, fg_color=DARK_BLUE_GREEN, text_color=WHITE)
+        self.offers_button.pack(side=tk.LEFT, padx=5)
+        self.offers_progress = ctk.CTkProgressBar(self.offers_bar, mode="indeterminate", progress_color=DARK_BLUE_GREEN)
+        self.offers_progress.set(0)
+        self.offers_progress.pack(side=tk.LEFT, padx=5, fill=tk.X, expand=True)
+        self.offers_status = ctk.CTkLabel(self.offers_bar, text="", text_color=BLACK)
+        self.offers_status.pack(side=tk.LEFT, padx=5)
+
     def create_messages_tab(self):
         self.messages_search_var = tk.StringVar()
         self.messages_search_entry = ctk.CTkEntry(self.messages_frame, textvariable=self.messages_search_var, placeholder_text=self.translations[self.current_language]['search'], fg_color=WHITE, text_color=BLACK)
         self.messages_search_entry.pack(pady=10)
         self.messages_search_entry.bind("<KeyRelease>", self.search_messages)
+        self.messages_search_entry.bind("<Return>", lambda event: self.jump_to(self.messages_tree, self.messages_search_var, self.messages_filter_var))
+        self.messages_filter_var = tk.BooleanVar(value=False)
+        self.messages_filter_check = ctk.CTkCheckBox(self.messages_frame, text=self.translations[self.current_language]['filter_matches'], variable=self.messages_filter_var, command=lambda: self.search_messages(None), text_color=BLACK)
+        self.messages_filter_check.pack()
 
-        self.messages_tree = ttk.Treeview(self.messages_frame, columns=("Order ID", "Name"), show="headings")
+        self.messages_model = ListModel()
+        self.messages_tree = VirtualTreeview(self.messages_frame, self.messages_model, columns=("Order ID", "Name"), show="headings")
         self.messages_tree.heading("Order ID", text=self.translations[self.current_language]['order_id'])
         self.messages_tree.heading("Name", text=self.translations[self.current_language]['product_name'])  # Gebruik product_name voor 'Naam'
 
         self.messages_tree.pack(fill=tk.BOTH, expand=True)
 
     def create_tab1(self):
-        ctk.CTkLabel(self.tab1_frame, text="Content for Tab 1", fg_color=WHITE, text_color=BLACK).pack(pady=20)
+        if self.client.metrics is None:
+            RequestMetrics().attach(self.client)  # Telt pas vanaf hier
+        self.metrics_text = ctk.CTkTextbox(self.tab1_frame, fg_color=WHITE, text_color=BLACK, font=("Courier", 12), wrap="none")
+        self.metrics_text.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        self.update_metrics()
+
+    def update_metrics(self):
+        """Show the current request metrics, refreshed while Tab1 is visible."""
+        if self.tab1_frame.winfo_ismapped():
+            self.metrics_text.configure(state="normal")
+            self.metrics_text.delete("1.0", tk.END)
+            self.metrics_text.insert("1.0", self.client.metrics.format_table())
+            self.metrics_text.configure(state="disabled")
+        self.after(METRICS_INTERVAL_MS, self.update_metrics)
 
     def create_tab2(self):
         ctk.CTkLabel(self.tab2_frame, text="Content for Tab 2", fg_color=WHITE, text_color=BLACK).pack(pady=20)
 
     def search_orders(self, event):
-        query = self.orders_search_var.get().lower()
-        for item in self.orders_tree.get_children():
-            values = self.orders_tree.item(item, "values")
-            if any(query in str(value).lower() for value in values):
-                self.orders_tree.item(item, tags=('match',))
-            else:
-                self.orders_tree.item(item, tags=('nomatch',))
-        self.orders_tree.tag_configure('match', background=LIGHT_BLUE)
-        self.orders_tree.tag_configure('nomatch', background=WHITE)
+        self.schedule_search(self.orders_tree, self.orders_search_var, self.orders_filter_var)
 
     def search_articles(self, event):
-        query = self.articles_search_var.get().lower()
-        for item in self.articles_tree.get_children():
-            values = self.articles_tree.item(item, "values")
-            if any(query in str(value).lower() for value in values):
-                self.articles_tree.item(item, tags=('match',))
-            else:
-                self.articles_tree.item(item, tags=('nomatch',))
-        self.articles_tree.tag_configure('match', background=LIGHT_BLUE)
-        self.articles_tree.tag_configure('nomatch', background=WHITE)
+        self.schedule_search(self.articles_tree, self.articles_search_var, self.articles_filter_var)
 
     def search_messages(self, event):
-        query = self.messages_search_var.get().lower()
-        for item in self.messages_tree.get_children():
-            values = self.messages_tree.item(item, "values")
-            if any(query in str(value).lower() for value in values):
-                self.messages_tree.item(item, tags=('match',))
-            else:
-                self.messages_tree.item(item, tags=('nomatch',))
-        self.messages_tree.tag_configure('match', background=LIGHT_BLUE)
-        self.messages_tree.tag_configure('nomatch', background=WHITE)
+        self.schedule_search(self.messages_tree, self.messages_search_var, self.messages_filter_var)
+
+    def schedule_search(self, view, query_var, filter_var):
+        """Search once typing pauses for SEARCH_DEBOUNCE_MS, instead of on every key."""
+        job = self.search_jobs.pop(view, None)
+        if job is not None:
+            self.after_cancel(job)
+        self.search_jobs[view] = self.after(SEARCH_DEBOUNCE_MS, lambda: self.run_search(view, query_var, filter_var))
+
+    def search_index(self, view):
+        """Return the search index of a tab, built from its model the first time it is needed."""
+        index = self.search_indexes.get(view)
+        if index is None:
+            index = self.search_indexes[view] = SearchIndex(view.model.items())
+        return index
+
+    def run_search(self, view, query_var, filter_var, to_top=True):
+        """Highlight the matching rows, or with the filter on, show only those."""
+        self.search_jobs.pop(view, None)
+        query = query_var.get()
+        # only a changed search scrolls back up, not e.g. the release of Enter after jump_to
+        searched = (query, filter_var.get())
+        to_top = to_top and self.last_searches.get(view) != searched
+        self.last_searches[view] = searched
+        if filter_var.get() and query.strip():
+            view.model.set_filter(self.search_index(view).search(query))
+        else:
+            view.model.set_filter(None)
+        if to_top:
+            view.first = 0
+        self.highlight_matches(view, query)
+
+    def jump_to(self, view, query_var, filter_var):
+        """Enter in a search box: scroll to the row whose first column (SO ID, EAN) is the query."""
+        if view in self.search_jobs:
+            self.after_cancel(self.search_jobs[view])
+            self.run_search(view, query_var, filter_var, to_top=False)
+        value = query_var.get().strip()
+        if value and not view.see_value(value):
+            self.bell()
+
+    def highlight_matches(self, view, query):
+        """Highlight the rows the filter would keep; only the visible rows are checked when drawn."""
+        terms = query_terms(query)
+        if terms:
+            view.row_tags = lambda index, row: ('match',) if matches(terms, row) else ('nomatch',)
+        else:
+            view.row_tags = None
+        view.tag_configure('match', background=LIGHT_BLUE)
+        view.tag_configure('nomatch', background=WHITE)
+        view.refresh()
 
     def load_orders_from_csv(self):
-        """Load orders from CSV and display them in the treeview."""
-        self.loaded_orders = set()
-        try:
-            with open("orders.csv", "r", encoding="ANSI") as csvfile:
-                reader = csv.reader(csvfile, delimiter=";")
-                next(reader)  # Skip header row
-                for row in reader:
-                    self.orders_tree.insert("", tk.END, values=row)
-                    self.loaded_orders.add(row[0])  # Voeg orderID toe aan de set
-        except FileNotFoundError:
-            print(self.translations[self.current_language]['csv_not_found'])
+        """Show the orders from the local store in the treeview.
+
+        On the first run, an existing orders.csv is imported into the store.
+        The rows themselves are read on demand, as they scroll into view."""
+        if self.store.count() == 0:
+            try:
+                self.store.import_csv("orders.csv")
+            except FileNotFoundError:
+                print(self.translations[self.current_language]['csv_not_found'])
+        self.orders_model.refresh()
+        self.orders_tree.refresh()
 
     def load_orders(self):
-        """Fetch orders from the API and update the treeview and CSV file."""
+        """Fetch orders from the API on a background worker.
+
+        Only new and changed order items are enriched; their rows are written
+        to the store as they arrive, new ones are added to the CSV file when the
+        run ends. Only one refresh runs at a time."""
+        if self.refresh_worker is not None:
+            return
+        if self.auto_refresh_job is not None:
+            self.after_cancel(self.auto_refresh_job)
+            self.auto_refresh_job = None
+
+        self.output_rows = []
+        self.new_items = []
+        self.delta = DeltaRefresh(self.client, self.store)
+        self.profile.start('first_network')  # Alleen de eerste refresh telt
+        self.refresh_worker = RefreshWorker(self.client, self.enricher, self.refresh_messages, self.delta)
+        self.refresh_worker.start()
+
+        self.refresh_button.configure(state="disabled")
+        self.cancel_button.configure(state="normal")
+        self.refresh_status.configure(text="")
+        self.refresh_progress.start()
+        self.after(DRAIN_INTERVAL_MS, self.drain_refresh_messages)
+
+    def cancel_refresh(self):
+        if self.refresh_worker is not None:
+            self.refresh_worker.cancel()
+
+    def drain_refresh_messages(self):
+        """Move finished rows from the worker queue into the treeview, on the Tk thread."""
+        for _ in range(DRAIN_BATCH):
+            try:
+                message = self.refresh_messages.get_nowait()
+            except queue.Empty:
+                delay = DRAIN_INTERVAL_MS
+                break
+            self.profile.stop('first_network')
+            if message[0] != ROW:
+                self.finish_refresh(message)
+                return
+            self.add_order_row(message[1], message[2])
+        else:
+            delay = 1  # Er staat nog meer klaar
+
+        self.save_new_items()
+        self.refresh_status.configure(text=self.translations[self.current_language]['items_loaded'].format(len(self.output_rows)))
+        self.after(delay, self.drain_refresh_messages)
+
+    def add_order_row(self, order_item_id, output_row):
+        # Alleen nieuwe en gewijzigde items komen hier; alleen de nieuwe gaan naar orders.csv
+        if self.delta.is_new(order_item_id):
+            self.output_rows.append(output_row)
+        self.new_items.append((order_item_id, output_row))
+
+    def save_new_items(self):
+        """Write the rows received since the last call to the store and show them."""
+        if self.new_items:
+            self.store.upsert_many(self.new_items, self.delta.seen)
+            index = self.search_indexes.get(self.orders_tree)
+            if index is not None:
+                index.add_many((str(order_item_id), row) for order_item_id, row in self.new_items if order_item_id is not None)
+            self.orders_model.added(self.new_items)
+            self.new_items = []
+            if self.orders_model.keys is not None:
+                # filtert opnieuw en tekent de lijst
+                self.run_search(self.orders_tree, self.orders_search_var, self.orders_filter_var, to_top=False)
+            else:
+                self.orders_tree.refresh()
+
+    def finish_refresh(self, message):
+        """Save the rows of the finished (or cancelled) run and reset the refresh controls."""
         try:
-            orders = self.client._orders()
-            output_rows = []
-
-            for order in orders:
-                for order_item in order['orderItems']:
-                    orderID = order['orderId']
-                    besteldatum = order['orderPlacedDateTime']
-                    eannummer = order_item['ean']
-                    aantal = order_item['quantity']
-                    Verzendmethode = order_item['fulfilmentMethod']
-                    if Verzendmethode == "FBR":
-                        Verzendmethode = "VVB"
-
-                    products = self.client._product(eannummer)
-
-                    naam = None
-                    beschrijving = None
-                    for attribute in products.get('attributes', []):
-                        if attribute['id'] == 'Title':
-                            naam = attribute['values'][0]['value']
-                        elif attribute['id'] == 'Description':
-                            beschrijving = attribute['values'][0]['value']
-
-                    if naam is None or naam == "":
-                        print(self.translations[self.current_language]['no_title_warning'].format(eannummer))
-
-                    merk = None
-                    for party in products.get('parties', []):
-                        if party['type'] == 'Brand' and party['role'] == 'BRAND':
-                            merk = party['name']
-                            break
-                    if not merk:
-                        merk = "Merkloos"
-                        print(self.translations[self.current_language]['no_brand_warning'].format(eannummer))
-
-                    # Haal klantgegevens op
-                    order_details = self.client._order(orderID)
-                    shipment_details = order_details.get('shipmentDetails', {})
-                    customer_name = f"{shipment_details.get('firstName', 'N/A')} {shipment_details.get('surname', 'N/A')}"
-                    customer_address = f"{shipment_details.get('streetName', 'N/A')} {shipment_details.get('houseNumber', 'N/A')} {shipment_details.get('houseNumberExtension', '')}"
-                    city = shipment_details.get('city', 'N/A')
-                    postal_code = shipment_details.get('zipCode', 'N/A')
-                    country = shipment_details.get('countryCode', 'N/A')
-
-                    billing_details = order_details.get('billingDetails', {})
-                    billing_name = f"{billing_details.get('firstName', 'N/A')} {billing_details.get('surname', 'N/A')}"
-                    billing_address = f"{billing_details.get('streetName', 'N/A')} {billing_details.get('houseNumber', 'N/A')} {billing_details.get('houseNumberExtension', '')}"
-                    billing_city = billing_details.get('city', 'N/A')
-                    billing_postal_code = billing_details.get('zipCode', 'N/A')
-                    billing_country = billing_details.get('countryCode', 'N/A')
-
-                    if orderID not in self.loaded_orders:  # Controleer of orderID al is geladen
-                        output_row = [orderID, besteldatum, eannummer, aantal, naam, merk, Verzendmethode, customer_name, customer_address, city, postal_code, country]
-                        output_rows.append(output_row)
-                        self.orders_tree.insert("", tk.END, values=output_row)
-                        self.loaded_orders.add(orderID)  # Voeg orderID toe aan de set
-
-            with open("orders.csv", "a", newline="", encoding="ANSI") as output_file:
+            self.save_new_items()
+            if message[0] == DONE and self.delta.finish():
+                # Verzonden of geannuleerde items verdwijnen uit de lijst
+                self.orders_model.refresh()
+                self.orders_tree.refresh()
+
+            with open("orders.csv", "a", newline="", encoding=CSV_ENCODING) as output_file:
                 writer = csv.writer(output_file, delimiter=";")
                 if output_file.tell() == 0:
-                    writer.writerow(["OrderID", "BestelDatum", "EanNummer", "Aantal", "Product", "Merk", "Verzendmethode", "Customer Name", "Customer Address", "City", "Postal Code", "Country"])
-                writer.writerows(output_rows)
-                
+                    writer.writerow(CSV_HEADER)
+                writer.writerows(self.output_rows)
         except Exception as e:
-            print(f"Failed to load orders: {e}")
+            print(f"Failed to save orders: {e}")
+        if self.export is not None:
+            self.export_new_items()
+
+        if message[0] == ERROR:
+            print(f"Failed to load orders: {message[1]}")
+            status = self.translations[self.current_language]['refresh_failed'].format(message[1])
+        elif message[0] == CANCELLED:
+            status = self.translations[self.current_language]['refresh_cancelled'].format(len(self.output_rows))
+        else:
+            status = self.translations[self.current_language]['items_loaded'].format(len(self.output_rows))
+
+        self.refresh_worker = None
+        self.refresh_progress.stop()
+        self.refresh_progress.set(0)
+        self.refresh_status.configure(text=status)
+        self.refresh_button.configure(state="normal")
+        self.cancel_button.configure(state="disabled")
+        self.schedule_auto_refresh()
+
+        if self.print_profile:
+            self.print_profile = False
+            print(self.profile.format())
+
+    def export_new_items(self):
+        """Export the items stored by the last refresh, on a background thread."""
+        def run():
+            try:
+                self.export.export(self.store)
+            except Exception as e:
+                print(f"Export failed: {e}")
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def load_offers(self):
+        """Load the whole catalog through an offers export, on a background worker."""
+        if self.offer_worker is not None:
+            return
+        self.articles_model.clear()
+        self.search_indexes.pop(self.articles_tree, None)
+        self.articles_tree.first = 0
+        self.articles_tree.refresh()
+        self.offer_worker = OfferExportWorker(OfferExport(self.client), self.offer_messages)
+        self.offer_worker.start()
+
+        self.offers_button.configure(state="disabled")
+        self.offers_status.configure(text="")
+        self.offers_progress.start()
+        self.after(DRAIN_INTERVAL_MS, self.drain_offer_messages)
+
+    def drain_offer_messages(self):
+        """Move offers from the export worker into the articles view, on the Tk thread."""
+        message = None
+        # een filter tijdens het laden heeft de index al gebouwd; houd die bij
+        index = self.search_indexes.get(self.articles_tree)
+        for _ in range(DRAIN_BATCH * 5):
+            try:
+                message = self.offer_messages.get_nowait()
+            except queue.Empty:
+                message = None
+                break
+            if message[0] != ROW:
+                break
+            key = self.articles_model.append(message[2])
+            if index is not None:
+                index.add(key, message[2])
+            message = None
+
+        self.articles_tree.refresh()
+        if message is None:
+            self.offers_status.configure(text=self.translations[self.current_language]['offers_loaded'].format(len(self.articles_model)))
+            self.after(DRAIN_INTERVAL_MS, self.drain_offer_messages)
+            return
+
+        if message[0] == ERROR:
+            print(f"Failed to load offers: {message[1]}")
+            status = self.translations[self.current_language]['offers_failed'].format(message[1])
+        else:
+            status = self.translations[self.current_language]['offers_loaded'].format(len(self.articles_model))
+        self.offer_worker = None
+        if self.articles_model.keys is not None:
+            self.run_search(self.articles_tree, self.articles_search_var, self.articles_filter_var, to_top=False)
+        self.offers_progress.stop()
+        self.offers_progress.set(0)
+        self.offers_status.configure(text=status)
+        self.offers_button.configure(state="normal")
+
+    def warn(self, key, ean):
+        print(self.translations[self.current_language][key].format(ean))
 
     def order_bestaat(self, orderID):
-        try:
-            with open('orders.csv', 'r', encoding="ANSI") as csvfile:
-                reader = csv.reader(csvfile, delimiter=";")
-                next(reader)
-                for row in reader:
-                    if row[0] == orderID:
-                        return True
-        except FileNotFoundError:
-            return False
-        return False
+        return self.store.has_order(orderID)
 
 if __name__ == "__main__":
     client_id = "Your-ID"
     client_secret = "Your-secret"
-    client = Client(client_id, client_secret)
-    
-    app = SalesOrderDashboard(client)
+    fast_start = "--fast-start" in sys.argv  # Venster direct tonen, inloggen bij de eerste request
+    profile = StartupProfile(_STARTED) if "--profile" in sys.argv else None
+    if profile is not None:
+        profile.record('import', _STARTED, _IMPORTED)
+
+    login_started = time.perf_counter()
+    client = Client(client_id, client_secret, token_file="tokens.json", login=not fast_start, metrics=RequestMetrics())
+    if profile is not None:
+        profile.record('login', login_started)
+
+    export = OrderExport() if "--export" in sys.argv else None  # naar de map export/
+
+    app = SalesOrderDashboard(client, fast_start=fast_start, profile=profile, export=export)
     app.mainloop()
@@ -0,0 +1,267 @@
+"""
+asyncio counterpart of client.Client, built on aiohttp.
+"""
+
+import asyncio
+import json
+import time
+from urllib.parse import urlencode
+
+try:
+    import aiohttp
+except ImportError:  # aiohttp is only needed for the async client
+    aiohttp = None
+
+from auth import _TOKEN_URL, AsyncTokenManager
+from cache import OrderCache, ProductCache
+from client import _DEFAULT_BASE_URL, _DEMO_BASE_URL, _USER_AGENT, is_problem, shipment_payload
+from ratelimit import RequestScheduler, endpoint_group
+
+
+class AsyncClient(object):
+    """Performs requests to the Bol.com API from asyncio code.
+
+    All requests share one pooled aiohttp session; max_concurrency bounds the
+    number of requests in flight. Create it inside a running event loop and
+    use it as an async context manager, or call close() when done.
+    """
+
+    def __init__(self, client_id, client_secret, demo=False, product_cache=None, order_cache=None,
+                 max_concurrency=20, token_file=None, scheduler=None, base_url=None, token_url=None, metrics=None):
+        if aiohttp is None:
+            raise ImportError("AsyncClient requires aiohttp")
+
+        if base_url:
+            self.BASE_URL = base_url.rstrip("/")
+        elif demo:
+            self.BASE_URL = _DEMO_BASE_URL
+        else:
+            self.BASE_URL = _DEFAULT_BASE_URL
+
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=max_concurrency),
+            headers={
+                'User-Agent': _USER_AGENT,
+                'Accept': 'application/vnd.retailer.v10+json',
+                'Content-Type': 'application/vnd.retailer.v10+json'
+            }
+        )
+        self.tokens = AsyncTokenManager(self.session, client_id, client_secret, token_url=token_url or _TOKEN_URL,
+                                        token_file=token_file)
+        self.scheduler = scheduler if scheduler is not None else RequestScheduler()
+        # in memory: a products.db lookup would block the event loop
+        self.product_cache = product_cache if product_cache is not None else ProductCache(path=None)
+        self.order_cache = order_cache if order_cache is not None else OrderCache()
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._inflight = {}
+        self.request_hooks = []
+        self.response_hooks = []
+        self.metrics = None
+        if metrics is not None:
+            metrics.attach(self)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def close(self):
+        await self.session.close()
+
+    async def _login(self):
+        """Log in to the api by retrieving a new Bearer token"""
+
+        return await self.tokens.refresh()
+
+    async def _send(self, method, url, payload=None):
+        """Performs an HTTP request with credentials, logging in again once on a 401.
+
+        Returns (status, headers, body as JSON).
+        """
+
+        token = await self.tokens.token()
+        for attempt in range(2):
+            async with self._semaphore:
+                for hook in self.request_hooks:
+                    hook(method, url)
+                started = time.perf_counter()
+                try:
+                    async with self.session.request(method, url, data=payload,
+                                                    headers={'Authorization': 'Bearer ' + token}) as response:
+                        data = await response.read()
+                except Exception:
+                    for hook in self.response_hooks:
+                        hook(method, url, None, 0, time.perf_counter() - started)
+                    raise
+                for hook in self.response_hooks:
+                    hook(method, url, response.status, len(data), time.perf_counter() - started)
+                if response.status == 401 and attempt == 0:
+                    self.tokens.invalidate(token)
+                else:
+                    return response.status, response.headers, json.loads(data) if data.strip() else {}
+            token = await self.tokens.token()
+
+    async def _request(self, method, url, payload=None):
+        """Performs an HTTP request within the rate limits, returning the body as JSON.
+
+        Retries as RequestScheduler.retry_delay() decides, like the synchronous client.
+        """
+
+        scheduler = self.scheduler
+        group = endpoint_group(method, url)
+        bucket = scheduler.bucket(group)
+
+        attempt = 0
+        while True:
+            delay = bucket.reserve()
+            while delay > 0:
+                scheduler.record(group, 'waited', delay)
+                await asyncio.sleep(delay)
+                delay = bucket.reserve()
+            scheduler.record(group, 'requests')
+
+            try:
+                status, headers, body = await self._send(method, url, payload)
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                delay = scheduler.retry_delay(method, group, attempt)
+                if delay is None:
+                    raise
+            else:
+                delay = scheduler.retry_delay(method, group, attempt, status, headers)
+                if delay is None:
+                    return body
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def _post(self, url, payload=None):
+        """Performs HTTP POST with credentials, returning the body as JSON."""
+
+        return await self._request('POST', url, payload)
+
+    async def _put(self, url, payload=None):
+        """Performs HTTP PUT with credentials, returning the body as JSON."""
+
+        return await self._request('PUT', url, payload)
+
+    async def _get(self, url, payload=None):
+        """Performs HTTP GET with credentials, returning the body as JSON."""
+
+        return await self._request('GET', url)
+
+    async def _single_flight(self, key, coro_fn):
+        """Let concurrent callers for key share one call of coro_fn()."""
+
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(coro_fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _orders_page(self, page, params):
+        """Fetch a single page of orders; an empty page is past the last one."""
+
+        query = dict(params, page=page)
+        body = await self._get(self.BASE_URL + "/orders?" + urlencode(query))
+        if is_problem(body):
+            raise RuntimeError("Orders page %d failed: %s" % (page, body.get('detail') or body.get('title')))
+        return body.get('orders', [])
+
+    async def iter_orders(self, status="OPEN", fulfilment_method=None, change_interval_minute=None,
+                          latest_change_date=None):
+        """Lazily iterate over all pages of orders, prefetching the next page.
+
+        Ends at the first empty page; a page that fails raises RuntimeError.
+        """
+
+        params = {'status': status}
+        if fulfilment_method:
+            params['fulfilment-method'] = fulfilment_method
+        if change_interval_minute is not None:
+            params['change-interval-minute'] = change_interval_minute
+        if latest_change_date:
+            params['latest-change-date'] = latest_change_date
+
+        page = 1
+        task = asyncio.ensure_future(self._orders_page(page, params))
+        try:
+            while True:
+                orders = await task
+                if not orders:
+                    return
+                page += 1
+                task = asyncio.ensure_future(self._orders_page(page, params))
+                for order in orders:
+                    yield order
+        finally:
+            task.cancel()
+
+    async def _orders(self):
+        """Fetch the open orders."""
+
+        return [order async for order in self.iter_orders()]
+
+    async def _fetch_order(self, orderId):
+        uri = self.BASE_URL + "/orders/" + str(orderId)
+        order = await self._get(uri)
+        if not is_problem(order):
+            self.order_cache.put(orderId, order)
+        return order
+
+    async def _order(self, orderId, max_age=None):
+        """Fetch order by id, served from the order cache while it is fresh."""
+
+        order = self.order_cache.get(orderId, max_age)
+        if order is None:
+            order = await self._single_flight(('order', str(orderId)), lambda: self._fetch_order(orderId))
+        return order
+
+    async def _order_item_shipment(self, orderItemId, trackAndTrace, transporterCode="TNT"):
+        """Push shipping info for orderItemId to bol."""
+
+        return await self._ship_order_items([orderItemId], trackAndTrace, transporterCode)
+
+    async def _ship_order_items(self, orderItems, trackAndTrace=None, transporterCode="TNT", shipmentReference=None):
+        """Ship several order items in one request, returning the process status."""
+
+        payload = shipment_payload(orderItems, trackAndTrace, transporterCode, shipmentReference)
+        return await self._put(self.BASE_URL + "/orders/shipment", payload=json.dumps(payload))
+
+    async def _process_statuses(self, processStatusIds):
+        """Fetch up to 1000 process statuses in one request."""
+
+        payload = {"processStatusQueries": [{"processStatusId": str(i)} for i in processStatusIds]}
+        return (await self._post(self.BASE_URL + "/shared/process-status", payload=json.dumps(payload))).get('processStatuses', [])
+
+    async def _cache(self, method, *args):
+        """Call a product cache method, on a worker thread if it reads or writes disk."""
+
+        if self.product_cache.path is None:
+            return method(*args)
+        return await asyncio.get_running_loop().run_in_executor(None, method, *args)
+
+    async def _fetch_product(self, ean):
+        uri = self.BASE_URL + "/content/catalog-products/" + str(ean)
+        product = await self._get(uri)
+        if is_problem(product):
+            return product, (None, None, None)
+        return product, await self._cache(self.product_cache.put, ean, product)
+
+    async def _product(self, ean):
+        """Fetch product details by ean"""
+
+        product = await self._cache(self.product_cache.get, ean)
+        if product is None:
+            product = (await self._single_flight(('product', str(ean)), lambda: self._fetch_product(ean)))[0]
+        return product
+
+    async def _product_info(self, ean):
+        """Fetch the (title, brand, description) record for ean."""
+
+        info = await self._cache(self.product_cache.info, ean)
+        if info is None:
+            info = (await self._single_flight(('product', str(ean)), lambda: self._fetch_product(ean)))[1]
+        return info
@@ -0,0 +1,163 @@
+"""
+Bearer token lifecycle for the Bol.com API.
+"""
+
+import asyncio
+import json
+import os
+import threading
+import time
+
+_TOKEN_URL = "https://login.bol.com/token"
+
+# token managers of several accounts can share one token_file
+_FILE_LOCK = threading.Lock()
+
+
+class TokenManager(object):
+    """Keeps a bearer token valid, refreshing it shortly before it expires.
+
+    Refreshes are single-flight: when several threads need a new token at the
+    same time only one of them logs in. With a token_file, tokens are reused
+    across processes until they expire.
+    """
+
+    def __init__(self, session, client_id, client_secret, token_url=_TOKEN_URL, token_file=None, margin=60):
+        """margin is the number of seconds before expiry at which the token is renewed."""
+
+        self.session = session
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.token_url = token_url
+        self.token_file = token_file
+        self.margin = margin
+        self.logins = 0
+        self._token = None
+        self._expires_at = 0
+        self._lock = threading.Lock()
+        self._load()
+
+    def _valid(self):
+        return self._token is not None and time.time() < self._expires_at - self.margin
+
+    def token(self):
+        """Return a valid access token, logging in if needed."""
+
+        if self._valid():
+            return self._token
+        with self._lock:
+            if not self._valid():
+                self._refresh()
+            return self._token
+
+    def refresh(self):
+        """Force a new login."""
+
+        with self._lock:
+            self._refresh()
+            return self._token
+
+    def invalidate(self, token):
+        """Mark token as expired, e.g. after a 401.
+
+        Only takes effect if token is still the current one, so a burst of 401s
+        for the same token leads to a single login.
+        """
+
+        with self._lock:
+            if token == self._token:
+                self._token = None
+                self._expires_at = 0
+
+    def _payload(self):
+        return {
+            'client_id': self.client_id,
+            'client_secret': self.client_secret,
+            'grant_type': 'client_credentials'
+        }
+
+    def _store(self, body, requested_at):
+        self._token = body['access_token']
+        self._expires_at = requested_at + int(body.get('expires_in', 299))
+        self.logins += 1
+
+    def _refresh(self):
+        # drop all cookies to prevent 2nd login failure due to timed out tokens
+        self.session.cookies.clear()
+
+        requested_at = time.time()
+        body = self.session.post(
+            url=self.token_url,
+            data=self._payload(),
+            headers={'Accept': 'application/json', 'Content-Type': None}
+        ).json()
+        self._store(body, requested_at)
+        self._save(self._token, self._expires_at)
+
+    def _read_file(self):
+        try:
+            with open(self.token_file, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _load(self):
+        if not self.token_file:
+            return
+        cached = self._read_file().get(self.client_id)
+        if cached:
+            self._token = cached['access_token']
+            self._expires_at = cached['expires_at']
+
+    def _save(self, token, expires_at):
+        if not self.token_file:
+            return
+        with _FILE_LOCK:
+            tokens = self._read_file()
+            tokens[self.client_id] = {'access_token': token, 'expires_at': expires_at}
+            tmp = self.token_file + ".tmp"
+            fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "w") as f:
+                json.dump(tokens, f)
+            os.replace(tmp, self.token_file)
+
+
+class AsyncTokenManager(TokenManager):
+    """TokenManager for an aiohttp session; token() and refresh() are coroutines."""
+
+    def __init__(self, session, client_id, client_secret, **kwargs):
+        super().__init__(session, client_id, client_secret, **kwargs)
+        self._async_lock = asyncio.Lock()
+
+    async def token(self):
+        """Return a valid access token, logging in if needed."""
+
+        if self._valid():
+            return self._token
+        async with self._async_lock:
+            if not self._valid():
+                await self._refresh()
+            return self._token
+
+    async def refresh(self):
+        """Force a new login."""
+
+        async with self._async_lock:
+            await self._refresh()
+            return self._token
+
+    async def _refresh(self):
+        self.session.cookie_jar.clear()
+
+        requested_at = time.time()
+        async with self.session.post(
+            self.token_url,
+            data=self._payload(),
+            headers={'Accept': 'application/json', 'Content-Type': 'application/x-www-form-urlencoded'}
+        ) as response:
+            body = await response.json(content_type=None)
+        with self._lock:
+            self._store(body, requested_at)
+        if self.token_file:
+            # writing the token file would block the event loop
+            await asyncio.get_running_loop().run_in_executor(None, self._save, self._token, self._expires_at)
@@ -0,0 +1,330 @@
+"""
+Benchmark of a full order refresh against a local stand-in for the bol Retailer API.
+
+    python benchmark.py                          # 10, 1000 and 10000 orders
+    python benchmark.py --orders 500 --latency 0.02 --fail-429-every 50 --json
+
+The mock server runs in its own process, so its allocations and CPU time
+don't end up in the client's numbers. Every scenario refreshes into an empty
+in-memory OrderStore with an empty product cache, like a first start, and is
+run twice: once for the timings and once under tracemalloc for peak memory.
+A second refresh right after the first shows the cost of a refresh when
+nothing changed.
+"""
+
+import argparse
+import json
+import multiprocessing
+import sys
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from cache import ProductCache
+from client import Client
+from ratelimit import RequestScheduler, endpoint_group
+from store import OrderStore
+from sync import SyncEngine
+
+
+class MockRetailerAPI(object):
+    """Generated orders and products, served the way the Retailer API serves them.
+
+    Orders are numbered; order item j of order i has EAN number
+    (i * items_per_order + j) % distinct_eans, so distinct_eans controls how
+    often EANs repeat. Every fail_401_every-th API request revokes the token
+    and every fail_429_every-th request is throttled (0 disables either).
+    """
+
+    def __init__(self, orders=10, items_per_order=1, distinct_eans=100, page_size=50, latency=0.0,
+                 fail_401_every=0, fail_429_every=0, retry_after=0.01):
+        self.orders = orders
+        self.items_per_order = items_per_order
+        self.distinct_eans = distinct_eans
+        self.page_size = page_size
+        self.latency = latency
+        self.fail_401_every = fail_401_every
+        self.fail_429_every = fail_429_every
+        self.retry_after = retry_after
+        self.counts = defaultdict(int)
+        self.requests = 0
+        self.token = None
+        self.logins = 0
+
+    def order_id(self, index):
+        return str(1000000000 + index)
+
+    def ean(self, number):
+        return "87%011d" % (number % self.distinct_eans)
+
+    def order(self, index, details=False):
+        order_id = self.order_id(index)
+        items = []
+        for j in range(self.items_per_order):
+            items.append({
+                'orderItemId': "%s%02d" % (order_id, j),
+                'latestChangedDateTime': "2024-05-19T21:00:00+02:00",
+                'ean': self.ean(index * self.items_per_order + j),
+                'quantity': 1,
+                'fulfilmentMethod': "FBR" if index % 3 else "FBB",
+            })
+        order = {'orderId': order_id, 'orderPlacedDateTime': "2024-05-19T21:00:00+02:00", 'orderItems': items}
+        if details:
+            address = {
+                'firstName': "Jan", 'surname': "Jansen %d" % index, 'streetName': "Dorpsstraat",
+                'houseNumber': str(index % 200 + 1), 'zipCode': "1234AB", 'city': "Utrecht", 'countryCode': "NL",
+            }
+            order['shipmentDetails'] = address
+            order['billingDetails'] = dict(address)
+        return order
+
+    def product(self, ean):
+        return {
+            'eans': [{'ean': ean}],
+            'attributes': [
+                {'id': 'Title', 'values': [{'value': "Product %s" % ean}]},
+                {'id': 'Description', 'values': [{'value': "Beschrijving van product %s" % ean}]},
+            ],
+            'parties': [{'name': "Merk %s" % ean[-2:], 'type': 'Brand', 'role': 'BRAND'}],
+        }
+
+    def offers_csv(self):
+        lines = ["offerId,ean,conditionName,conditionCategory,conditionComment,bundlePricesPrice,"
+                 "fulfilmentDeliveryCode,stockAmount,onHoldByRetailer,fulfilmentType,mutationDateTime,referenceCode,correctedStock"]
+        for number in range(self.distinct_eans):
+            lines.append("offer-%d,%s,NEW,NEW,,%d.95,24uurs-23,%d,false,FBR,2024-05-19T21:00:00+02:00,REF%d,%d" % (
+                number, self.ean(number), 10 + number % 90, number % 50, number, number % 50))
+        return "\r\n".join(lines) + "\r\n"
+
+    def handle(self, method, path, query, authorization, body=b""):
+        """Return (status, headers, body) for a request; a str body is sent as CSV."""
+
+        if path == "/token":
+            self.counts['token'] += 1
+            self.logins += 1
+            self.token = "token-%d" % self.logins
+            return 200, {}, {'access_token': self.token, 'token_type': "Bearer", 'expires_in': 299}
+        if path == "/_stats":
+            return 200, {}, {'requests': dict(self.counts), 'logins': self.logins}
+
+        self.requests += 1
+        if self.fail_401_every and self.requests % self.fail_401_every == 0:
+            self.token = None
+        if authorization != "Bearer %s" % self.token:
+            self.counts['unauthorized'] += 1
+            return 401, {}, {'status': 401, 'title': "Unauthorized"}
+        if self.fail_429_every and self.requests % self.fail_429_every == 0:
+            self.counts['throttled'] += 1
+            return 429, {'Retry-After': str(self.retry_after)}, {'status': 429, 'title': "Too Many Requests"}
+
+        group = endpoint_group(method, path)
+        self.counts[group] += 1
+        parts = path.strip("/").split("/")
+        if method == "GET" and path == "/orders":
+            page = int(query.get('page', ['1'])[0])
+            start = (page - 1) * self.page_size
+            stop = min(self.orders, start + self.page_size)
+            orders = [self.order(i) for i in range(start, stop)]
+            return 200, {}, {'orders': orders} if orders else {}  # bol leaves the key out past the last page
+        if method == "GET" and len(parts) == 2 and parts[0] == "orders":
+            index = int(parts[1]) - 1000000000
+            if 0 <= index < self.orders:
+                return 200, {}, self.order(index, details=True)
+        if method == "GET" and parts[:2] == ["content", "catalog-products"]:
+            return 200, {}, self.product(parts[2])
+        if method == "PUT" and path == "/orders/shipment":
+            return 202, {}, {'processStatusId': str(self.requests), 'status': "PENDING"}
+        if method == "POST" and path == "/offers/export":
+            return 202, {}, {'processStatusId': "export-%d" % self.requests, 'status': "PENDING"}
+        if method == "GET" and parts[:2] == ["offers", "export"]:
+            return 200, {}, self.offers_csv()
+        if parts[:2] == ["shared", "process-status"]:
+            if method == "POST":
+                ids = [query['processStatusId'] for query in json.loads(body)['processStatusQueries']]
+            else:
+                ids = parts[2:3]
+            # a process status succeeds the first time it is asked for
+            statuses = [{'processStatusId': i, 'status': "SUCCESS", 'entityId': "report-" + i} for i in ids]
+            if method == "POST":
+                return 200, {}, {'processStatuses': statuses}
+            return 200, {}, statuses[0]
+        return 404, {}, {'status': 404, 'title': "Not Found"}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real API
+    disable_nagle_algorithm = True  # headers and body are separate writes
+
+    def _respond(self, method):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b""
+        url = urlparse(self.path)
+        api = self.server.api
+        if api.latency:
+            time.sleep(api.latency)
+        with self.server.lock:
+            status, headers, body = api.handle(method, url.path, parse_qs(url.query), self.headers.get('Authorization'), body)
+        if isinstance(body, str):
+            data, content_type = body.encode(), "application/vnd.retailer.v10+csv"
+        else:
+            data, content_type = json.dumps(body).encode(), "application/vnd.retailer.v10+json"
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        self._respond("GET")
+
+    def do_POST(self):
+        self._respond("POST")
+
+    def do_PUT(self):
+        self._respond("PUT")
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(api, ready):
+    """Serve api on a free localhost port, sending the port through the ready pipe."""
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    server.daemon_threads = True
+    server.api = api
+    server.lock = threading.Lock()
+    ready.send(server.server_address[1])
+    server.serve_forever()
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def run_scenario(api, rate=10000.0, trace_memory=False):
+    """Refresh all orders of api once and return the measurements as a dict.
+
+    tracemalloc slows the client down a lot, so with trace_memory only the
+    peak memory is worth reading; run once without it for the timings.
+    """
+
+    parent, child = multiprocessing.Pipe()
+    server = multiprocessing.Process(target=serve, args=(api, child), daemon=True)
+    server.start()
+    try:
+        url = "http://127.0.0.1:%d" % parent.recv()
+        client = Client("benchmark", "benchmark", base_url=url, token_url=url + "/token", login=False,
+                        scheduler=RequestScheduler(rate=rate), product_cache=ProductCache(path=None))
+
+        latencies = defaultdict(list)
+        send = client._send
+
+        def timed_send(method, url, *args):
+            started = time.perf_counter()
+            try:
+                return send(method, url, *args)
+            finally:
+                latencies[endpoint_group(method, url)].append(time.perf_counter() - started)
+
+        client._send = timed_send
+        engine = SyncEngine(client, OrderStore(":memory:"))
+
+        peak = None
+        if trace_memory:
+            tracemalloc.start()
+            try:
+                stats = engine.run_once()
+                peak = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+        else:
+            stats = engine.run_once()
+
+        served = client.session.get(url + "/_stats").json()
+        # a second refresh finds nothing new, as in steady state
+        engine.run_once()
+        again = client.session.get(url + "/_stats").json()
+    finally:
+        server.terminate()
+        server.join()
+
+    calls = {}
+    for group, values in sorted(latencies.items()):
+        calls[group] = {
+            'count': len(values),
+            'p50_ms': round(percentile(values, 0.50) * 1000, 2),
+            'p99_ms': round(percentile(values, 0.99) * 1000, 2),
+        }
+    return {
+        'orders': api.orders,
+        'items': api.orders * api.items_per_order,
+        'stored_items': stats['stored_items'],
+        'missing_items': api.orders * api.items_per_order - stats['stored_items'],
+        'error': stats.get('error'),
+        'requests': sum(served['requests'].values()),
+        'steady_state_requests': sum(again['requests'].values()) - sum(served['requests'].values()),
+        'requests_by_endpoint': served['requests'],
+        'wall_time': stats['wall_time'],
+        'peak_memory_kb': None if peak is None else round(peak / 1024),
+        'calls': calls,
+    }
+
+
+def print_report(results):
+    for result in results:
+        line = ("%(orders)d orders, %(items)d items: %(requests)d requests, %(wall_time).2f s, "
+                "%(steady_state_requests)d requests when nothing changed" % result)
+        if result['peak_memory_kb'] is not None:
+            line += ", peak memory %d kB" % result['peak_memory_kb']
+        print(line)
+        if result['error']:
+            print("  error: %s" % result['error'])
+        if result['missing_items']:
+            print("  WRONG: stored %(stored_items)d of %(items)d items, the numbers above don't count" % result)
+        print("  requests: " + ", ".join("%s=%d" % item for item in sorted(result['requests_by_endpoint'].items())))
+        for group, call in result['calls'].items():
+            print("  %-16s %6d calls  p50 %7.2f ms  p99 %7.2f ms" % (group, call['count'], call['p50_ms'], call['p99_ms']))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark an order refresh against a mock Retailer API.")
+    parser.add_argument("--orders", default="10,1000,10000", help="comma separated order counts (default 10,1000,10000)")
+    parser.add_argument("--items-per-order", type=int, default=1)
+    parser.add_argument("--distinct-eans", type=int, default=100, help="number of different EANs the items cycle through")
+    parser.add_argument("--page-size", type=int, default=50, help="orders per /orders page")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds the server waits before every response")
+    parser.add_argument("--fail-401-every", type=int, default=0, help="revoke the token every N requests")
+    parser.add_argument("--fail-429-every", type=int, default=0, help="throttle every N-th request")
+    parser.add_argument("--retry-after", type=float, default=0.01, help="Retry-After of throttled responses")
+    parser.add_argument("--rate", type=float, default=10000.0, help="client requests per second per endpoint group")
+    parser.add_argument("--no-memory", action="store_true", help="skip the second, traced run that measures peak memory")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    args = parser.parse_args(argv)
+
+    results = []
+    for orders in [int(count) for count in args.orders.split(",")]:
+        api = MockRetailerAPI(orders, args.items_per_order, args.distinct_eans, args.page_size, args.latency,
+                              args.fail_401_every, args.fail_429_every, args.retry_after)
+        result = run_scenario(api, args.rate)
+        if not args.no_memory:
+            result['peak_memory_kb'] = run_scenario(api, args.rate, trace_memory=True)['peak_memory_kb']
+        results.append(result)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_report(results)
+    return 1 if any(result['error'] or result['missing_items'] for result in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
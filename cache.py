@@ -0,0 +1,335 @@
+"""
+Local caches in front of the Bol.com API.
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+def parse_product(product):
+    """Extract the compact (title, brand, description) record from a catalog product."""
+
+    title = None
+    description = None
+    for attribute in product.get('attributes', []):
+        if attribute['id'] == 'Title':
+            title = attribute['values'][0]['value']
+        elif attribute['id'] == 'Description':
+            description = attribute['values'][0]['value']
+
+    brand = None
+    for party in product.get('parties', []):
+        if party['type'] == 'Brand' and party['role'] == 'BRAND':
+            brand = party['name']
+            break
+
+    return title, brand, description
+
+
+# offers export fields kept per offer, with their column in the offers table
+_OFFER_COLUMNS = [
+    ("offerId", "offer_id"),
+    ("ean", "ean"),
+    ("referenceCode", "reference"),
+    ("conditionName", "condition"),
+    ("bundlePricesPrice", "price"),
+    ("stockAmount", "stock"),
+    ("fulfilmentType", "fulfilment"),
+    ("mutationDateTime", "mutated"),
+]
+
+
+class ProductCache(object):
+    """LRU cache with TTL for catalog products, backed by an on-disk SQLite store.
+
+    Every entry keeps the raw product JSON together with the pre-parsed
+    (title, brand, description) record, so callers that only need the record
+    don't walk the attributes and parties again on every hit.
+    """
+
+    def __init__(self, path="products.db", max_entries=1000, ttl=7 * 24 * 3600):
+        """Use path=None for a memory-only cache."""
+
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS products ("
+                "ean TEXT PRIMARY KEY, fetched REAL, title TEXT, brand TEXT, description TEXT, body TEXT)"
+            )
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS offers (offer_id TEXT PRIMARY KEY, %s, exported REAL)"
+                % ", ".join("%s TEXT" % column for _, column in _OFFER_COLUMNS[1:])
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS offers_ean ON offers (ean)")
+            self._db.commit()
+        self._offers = {}  # Alleen gebruikt zonder database
+
+    def _remember(self, ean, entry):
+        self._entries[ean] = entry
+        self._entries.move_to_end(ean)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _lookup(self, ean):
+        """Return the (fetched, product, info) entry for ean, or None on a miss."""
+
+        ean = str(ean)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(ean)
+            if entry is not None and now - entry[0] < self.ttl:
+                self._entries.move_to_end(ean)
+                self.hits += 1
+                return entry
+            if entry is not None:
+                del self._entries[ean]
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT fetched, title, brand, description, body FROM products WHERE ean = ?", (ean,)
+                ).fetchone()
+                if row is not None and now - row[0] < self.ttl:
+                    entry = (row[0], json.loads(row[4]), (row[1], row[2], row[3]))
+                    self._remember(ean, entry)
+                    self.disk_hits += 1
+                    return entry
+
+            self.misses += 1
+            return None
+
+    def get(self, ean):
+        """Return the cached product JSON for ean, or None."""
+
+        entry = self._lookup(ean)
+        return entry[1] if entry else None
+
+    def info(self, ean):
+        """Return the cached (title, brand, description) record for ean, or None."""
+
+        entry = self._lookup(ean)
+        return entry[2] if entry else None
+
+    def infos(self):
+        """Return {ean: (title, brand, description)} for every cached product.
+
+        One read for a whole view, e.g. the offers of the articles tab; unlike
+        info() it doesn't count hits or misses, nor skip expired products.
+        """
+
+        with self._lock:
+            if self._db is None:
+                return {ean: entry[2] for ean, entry in self._entries.items()}
+            rows = self._db.execute("SELECT ean, title, brand, description FROM products").fetchall()
+        return {row[0]: row[1:] for row in rows}
+
+    def put(self, ean, product, info=None):
+        """Store a product, returning its (title, brand, description) record."""
+
+        ean = str(ean)
+        if info is None:
+            info = parse_product(product)
+        fetched = time.time()
+        with self._lock:
+            self._remember(ean, (fetched, product, info))
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO products (ean, fetched, title, brand, description, body) VALUES (?, ?, ?, ?, ?, ?)",
+                    (ean, fetched) + tuple(info) + (json.dumps(product),)
+                )
+                self._db.commit()
+        return info
+
+    def invalidate(self, ean):
+        """Drop a single EAN from memory and disk."""
+
+        ean = str(ean)
+        with self._lock:
+            self._entries.pop(ean, None)
+            if self._db is not None:
+                self._db.execute("DELETE FROM products WHERE ean = ?", (ean,))
+                self._db.commit()
+
+    def put_offers(self, offers, exported):
+        """Store offers from an offers export, as dicts keyed by the export's column names.
+
+        exported identifies the export; see drop_offers_before().
+        """
+
+        rows = [[offer.get(field) for field, _ in _OFFER_COLUMNS] + [exported] for offer in offers]
+        with self._lock:
+            if self._db is None:
+                for row in rows:
+                    self._offers[row[0]] = row
+                return
+            self._db.executemany(
+                "INSERT OR REPLACE INTO offers (%s, exported) VALUES (%s)" % (
+                    ", ".join(column for _, column in _OFFER_COLUMNS), ", ".join("?" * (len(_OFFER_COLUMNS) + 1))),
+                rows
+            )
+            self._db.commit()
+
+    def drop_offers_before(self, exported):
+        """Remove the offers that were not part of the export marked exported, or a later one."""
+
+        with self._lock:
+            if self._db is None:
+                for offer_id in [key for key, row in self._offers.items() if row[-1] < exported]:
+                    del self._offers[offer_id]
+                return
+            self._db.execute("DELETE FROM offers WHERE exported < ?", (exported,))
+            self._db.commit()
+
+    def offers(self):
+        """Return the stored offers as dicts, ordered by EAN."""
+
+        with self._lock:
+            if self._db is None:
+                rows = sorted(self._offers.values(), key=lambda row: row[1] or "")
+            else:
+                rows = self._db.execute(
+                    "SELECT %s FROM offers ORDER BY ean" % ", ".join(column for _, column in _OFFER_COLUMNS)
+                ).fetchall()
+        return [dict(zip([field for field, _ in _OFFER_COLUMNS], row)) for row in rows]
+
+    def clear(self):
+        """Drop every cached product."""
+
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM products")
+                self._db.commit()
+
+    def stats(self):
+        """Return the hit/miss counters."""
+
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'entries': len(self._entries),
+            }
+
+
+class _Call(object):
+    """A call in flight, shared by every caller waiting for the same key."""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight(object):
+    """Lets concurrent callers for the same key share the result of one call."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn):
+        """Run fn for key, or wait for the call that is already running for it."""
+
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+        return call.result
+
+
+class OrderCache(object):
+    """Order details keyed by orderId, with a freshness window and single-flight fetching."""
+
+    def __init__(self, max_age=300, max_entries=5000):
+        self.max_age = max_age
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._flight = SingleFlight()
+
+    def _peek(self, order_id, max_age):
+        with self._lock:
+            entry = self._entries.get(order_id)
+            if entry is not None and time.time() - entry[0] <= max_age:
+                self._entries.move_to_end(order_id)
+                return entry[1]
+        return None
+
+    def get(self, order_id, max_age=None):
+        """Return the cached order if it is younger than max_age seconds, else None."""
+
+        order = self._peek(str(order_id), self.max_age if max_age is None else max_age)
+        with self._lock:
+            if order is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return order
+
+    def get_or_fetch(self, order_id, loader, max_age=None):
+        """Return the cached order, or call loader(order_id) once for all concurrent callers.
+
+        The loader is responsible for calling put() with whatever should be cached.
+        """
+
+        order_id = str(order_id)
+        if max_age is None:
+            max_age = self.max_age
+        order = self.get(order_id, max_age)
+        if order is None:
+            order = self._flight.do(order_id, lambda: self._peek(order_id, max_age) or loader(order_id))
+        return order
+
+    def put(self, order_id, order):
+        order_id = str(order_id)
+        with self._lock:
+            self._entries[order_id] = (time.time(), order)
+            self._entries.move_to_end(order_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, order_id):
+        with self._lock:
+            self._entries.pop(str(order_id), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Return the hit/miss counters."""
+
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'entries': len(self._entries)}
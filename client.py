@@ -5,22 +5,97 @@ Core client functionality, common across all API requests.
 versie = "1.0"
 
 import requests
+from requests.adapters import HTTPAdapter
 from urllib.parse import urlencode
 import json
+import time
+from concurrent.futures import ThreadPoolExecutor
 
-from bol import __version__ as __version
+from auth import _TOKEN_URL, TokenManager
+from cache import OrderCache, ProductCache
+from ratelimit import RequestScheduler
+try:
+    from bol import __version__ as __version
+except ImportError:  # Los gebruikt, zonder het bol-pakket
+    __version = versie
 _USER_AGENT = "BolApiClientPython/%s" % __version
 _DEFAULT_BASE_URL = "https://api.bol.com/retailer"
 _DEMO_BASE_URL = "https://api.bol.com/retailer-demo"
 
 
+def is_problem(body):
+    """Tell whether a response body is a problem (error) response."""
+
+    return isinstance(body.get('status'), int)
+
+
+def new_session(pool_size=10):
+    """Return a requests session for the Retailer API with pool_size pooled connections per host."""
+
+    session = requests.Session()
+    session.mount('https://', HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size))
+    session.mount('http://', HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size))
+    session.headers.update({
+        'User-Agent': _USER_AGENT,
+        'Accept': 'application/vnd.retailer.v10+json',
+        'Content-Type': 'application/vnd.retailer.v10+json'
+    })
+    return session
+
+
+def shipment_payload(orderItems, trackAndTrace=None, transporterCode="TNT", shipmentReference=None):
+    """Build the body of a shipment request.
+
+    orderItems holds orderItemIds, or (orderItemId, quantity) pairs for partial shipments.
+    """
+
+    items = []
+    for item in orderItems:
+        if isinstance(item, (tuple, list)):
+            items.append({"orderItemId": str(item[0]), "quantity": item[1]})
+        else:
+            items.append({"orderItemId": str(item)})
+
+    payload = {"orderItems": items}
+    if shipmentReference:
+        payload["shipmentReference"] = shipmentReference
+    if trackAndTrace:
+        payload["transport"] = {
+            "transporterCode": transporterCode,
+            "trackAndTrace": trackAndTrace
+        }
+    return payload
+
+
 class Client(object):
     """Performs requests to the Bol.com API."""
 
-    def __init__(self, client_id, client_secret, demo=False):
-        """Base Bol.com api client."""
+    def __init__(self, client_id, client_secret, demo=False, product_cache=None, order_cache=None, pool_size=10,
+                 token_file=None, scheduler=None, login=True, base_url=None, token_url=None,
+                 metrics=None, session=None):
+        """Base Bol.com api client.
+
+        pool_size is the number of pooled connections kept open, which should be
+        at least the number of worker threads sharing this client. With a
+        token_file, a still valid token from an earlier run is reused instead
+        of logging in again. scheduler paces and retries requests, see
+        ratelimit.RequestScheduler. With login=False the client logs in on its
+        first request instead of right away. base_url and token_url point the
+        client at another server, such as the mock API in benchmark.py.
 
-        if demo:
+        request_hooks are called as hook(method, url) before every HTTP
+        attempt and response_hooks as hook(method, url, status, size, elapsed)
+        after it, with status None if it raised. metrics, a
+        metrics.RequestMetrics, is attached to these hooks.
+
+        session, from new_session(), lets several clients share one connection
+        pool; the token goes with each request, not on the session, so every
+        client keeps its own login. pool_size is ignored then.
+        """
+
+        if base_url:
+            self.BASE_URL = base_url.rstrip("/")
+        elif demo:
             self.BASE_URL = _DEMO_BASE_URL
             print("Using demo environment")
         else:
@@ -28,91 +103,209 @@ class Client(object):
         
         self.client_id = client_id
         self.client_secret = client_secret
-        self.session = requests.Session()
-        self._login()
+        self.session = session if session is not None else new_session(pool_size)
+        self.tokens = TokenManager(self.session, client_id, client_secret, token_url=token_url or _TOKEN_URL,
+                                   token_file=token_file)
+        self.scheduler = scheduler if scheduler is not None else RequestScheduler()
+        self.product_cache = product_cache if product_cache is not None else ProductCache()
+        self.order_cache = order_cache if order_cache is not None else OrderCache()
+        self.request_hooks = []
+        self.response_hooks = []
+        self.metrics = None
+        if metrics is not None:
+            metrics.attach(self)
+        if login:
+            self.tokens.token()
 
     def _login(self):
-        """Log in to the api by retrieving a Bearer token"""
+        """Log in to the api by retrieving a new Bearer token"""
 
-        # drop all cookies and headers to prevent 2nd login failure due to timed out tokens
-        self.session.cookies.clear()
-        self.session.headers.clear()
+        return self.tokens.refresh()
 
-        self.session.headers.update({
-            'User-Agent': _USER_AGENT,
-            'Accept': 'application/json'
-        })
+    def _request(self, method, url, payload=None, headers=None, stream=False):
+        """Performs an HTTP request through the rate-limit scheduler.
 
-        payload = {
-            'client_id': self.client_id,
-            'client_secret': self.client_secret,
-            'grant_type': 'client_credentials'
-        }
+        headers are added to the session headers; with stream the body is
+        left unread, for the caller to iterate over and close.
+        """
+
+        return self.scheduler.send(method, url, lambda: self._send(method, url, payload, headers, stream))
+
+    def _send(self, method, url, payload=None, headers=None, stream=False):
+        """Performs an HTTP request with credentials, logging in again once on a 401."""
+
+        token = self.tokens.token()
+        response = self._send_once(method, url, payload, token, headers, stream)
+        if response.status_code == 401:
+            response.close()
+            self.tokens.invalidate(token)
+            token = self.tokens.token()
+            response = self._send_once(method, url, payload, token, headers, stream)
+        return response
 
-        self.token = self.session.post(
-            url='https://login.bol.com/token',
-            data=payload
-        ).json()['access_token']
+    def _send_once(self, method, url, payload, token, headers=None, stream=False):
+        """Performs a single HTTP request, reporting it to the request and response hooks."""
 
-        self.session.headers.update({
-            'User-Agent': _USER_AGENT,
-            'Accept': 'application/vnd.retailer.v10+json',
-            'Content-Type': 'application/vnd.retailer.v10+json',
-            'Authorization': 'Bearer ' + self.token
-        })
+        headers = dict(headers or {}, Authorization='Bearer ' + token)
+        for hook in self.request_hooks:
+            hook(method, url)
+        started = time.perf_counter()
+        try:
+            response = self.session.request(method, url, data=payload, headers=headers, stream=stream)
+        except Exception:
+            for hook in self.response_hooks:
+                hook(method, url, None, 0, time.perf_counter() - started)
+            raise
+        elapsed = time.perf_counter() - started
+        # a streamed body isn't read yet, so only its announced size is known
+        size = int(response.headers.get('Content-Length') or 0) if stream else len(response.content)
+        for hook in self.response_hooks:
+            hook(method, url, response.status_code, size, elapsed)
+        return response
 
     def _post(self, url, payload=None):
         """Performs HTTP POST with credentials, returning the body as JSON."""
 
-        response = self.session.post(url, data=payload)
-        if response.status_code == 401:
-            self._login()
-            response = self.session.post(url, data=payload)
-        return response.json()
+        return self._request('POST', url, payload).json()
 
     def _put(self, url, payload=None):
         """Performs HTTP PUT with credentials, returning the body as JSON."""
 
-        response = self.session.put(url, data=payload)
-        if response.status_code == 401:
-            self._login()
-            response = self.session.put(url, data=payload)
-        return response.json()
+        return self._request('PUT', url, payload).json()
 
     def _get(self, url, payload=None):
         """Performs HTTP GET with credentials, returning the body as JSON."""
 
-        response = self.session.get(url)
-        if response.status_code == 401:
-            self._login()
-            response = self.session.get(url)
-        return response.json()
+        return self._request('GET', url).json()
+
+    def _orders_page(self, page, params):
+        """Fetch a single page of orders; an empty page is past the last one."""
+
+        query = dict(params, page=page)
+        body = self._get(self.BASE_URL + "/orders?" + urlencode(query))
+        if is_problem(body):
+            # anders lijkt de lijst compleet terwijl er pagina's ontbreken
+            raise RuntimeError("Orders page %d failed: %s" % (page, body.get('detail') or body.get('title')))
+        return body.get('orders', [])
+
+    def iter_orders(self, status="OPEN", fulfilment_method=None, change_interval_minute=None,
+                    latest_change_date=None, prefetch=True):
+        """Lazily iterate over all pages of orders.
+
+        With prefetch, the next page is downloaded in the background while the
+        current one is being consumed. Iteration ends at the first empty page;
+        a page that fails raises RuntimeError, so a list that was cut short is
+        never taken for the complete one.
+        """
+
+        params = {'status': status}
+        if fulfilment_method:
+            params['fulfilment-method'] = fulfilment_method
+        if change_interval_minute is not None:
+            params['change-interval-minute'] = change_interval_minute
+        if latest_change_date:
+            params['latest-change-date'] = latest_change_date
+
+        if not prefetch:
+            page = 1
+            while True:
+                orders = self._orders_page(page, params)
+                if not orders:
+                    return
+                yield from orders
+                page += 1
+
+        with ThreadPoolExecutor(1) as pool:
+            page = 1
+            future = pool.submit(self._orders_page, page, params)
+            while True:
+                orders = future.result()
+                if not orders:
+                    return
+                page += 1
+                future = pool.submit(self._orders_page, page, params)
+                yield from orders
 
     def _orders(self):
         """Fetch the open orders."""
 
-        return self._get(self.BASE_URL + "/orders?status=OPEN")['orders']
+        return list(self.iter_orders())
 
-    def _order(self, orderId):
-        """Fetch order by id."""
+    def _fetch_order(self, orderId):
+        """Fetch order by id from the api and cache it."""
 
         uri = self.BASE_URL + "/orders/" + str(orderId)
-        return self._get(uri)
-        
+        order = self._get(uri)
+        if not is_problem(order):
+            self.order_cache.put(orderId, order)
+        return order
+
+    def _order(self, orderId, max_age=None):
+        """Fetch order by id, served from the order cache while it is fresh.
+
+        max_age overrides the cache's freshness window in seconds; 0 forces a fetch.
+        """
+
+        return self.order_cache.get_or_fetch(orderId, self._fetch_order, max_age=max_age)
 
     def _order_item_shipment(self, orderItemId, trackAndTrace, transporterCode="TNT"):
         """Push shipping info for orderItemId to bol."""
 
-        payload = {
-            "transport": {
-                "transporterCode": transporterCode,
-                "trackAndTrace": trackAndTrace
-            }
-        }
-        return self._put(self.BASE_URL + "/orders/" + str(orderItemId) + "/shipment", payload=json.dumps(payload))
+        return self._ship_order_items([orderItemId], trackAndTrace, transporterCode)
+
+    def _ship_order_items(self, orderItems, trackAndTrace=None, transporterCode="TNT", shipmentReference=None):
+        """Ship several order items in one request, returning the process status."""
+
+        payload = shipment_payload(orderItems, trackAndTrace, transporterCode, shipmentReference)
+        return self._put(self.BASE_URL + "/orders/shipment", payload=json.dumps(payload))
+
+    def _process_status(self, processStatusId):
+        """Fetch a single process status by id."""
+
+        return self._get(self.BASE_URL + "/shared/process-status/" + str(processStatusId))
+
+    def _process_statuses(self, processStatusIds):
+        """Fetch up to 1000 process statuses in one request."""
+
+        payload = {"processStatusQueries": [{"processStatusId": str(i)} for i in processStatusIds]}
+        return self._post(self.BASE_URL + "/shared/process-status", payload=json.dumps(payload)).get('processStatuses', [])
+
+    def _request_offer_export(self, format="CSV"):
+        """Ask bol to prepare an export of all our offers, returning the process status.
+
+        Once the process status succeeded, its entityId is the report id for _offer_export().
+        """
+
+        return self._post(self.BASE_URL + "/offers/export", payload=json.dumps({"format": format}))
+
+    def _offer_export(self, reportId):
+        """Download an offers export as a streamed CSV response; close it when done."""
+
+        return self._request('GET', self.BASE_URL + "/offers/export/" + str(reportId),
+                             headers={'Accept': 'application/vnd.retailer.v10+csv'}, stream=True)
+
+    def _fetch_product(self, ean):
+        """Fetch product details from the api and cache them, returning (product, info)."""
+
+        uri = self.BASE_URL + "/content/catalog-products/" + str(ean)
+        product = self._get(uri)
+        if is_problem(product):
+            # problem response, don't cache it
+            return product, (None, None, None)
+        return product, self.product_cache.put(ean, product)
 
     def _product(self, ean):
         """Fetch product details by ean"""
 
-        uri = self.BASE_URL + "/content/catalog-products/" + str(ean)
-        return self._get(uri)
+        product = self.product_cache.get(ean)
+        if product is None:
+            product = self._fetch_product(ean)[0]
+        return product
+
+    def _product_info(self, ean):
+        """Fetch the (title, brand, description) record for ean."""
+
+        info = self.product_cache.info(ean)
+        if info is None:
+            info = self._fetch_product(ean)[1]
+        return info
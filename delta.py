@@ -0,0 +1,73 @@
+"""
+Incremental refresh: only enrich the order items that are new or changed.
+"""
+
+from models import Order
+
+
+class DeltaRefresh(object):
+    """Compares the OPEN order list with the OPEN items of an OrderStore.
+
+    Wrap the order iterator with orders() before enriching it; it drops the
+    items the store already has with the same latestChangedDateTime, and
+    orders that have nothing left. Once the whole list has been read,
+    finish() marks the stored items that are no longer open as CLOSED; after
+    a failed or cancelled run it leaves the store alone.
+    A steady-state refresh therefore only costs the list calls.
+    """
+
+    def __init__(self, client, store, full=False, account=None):
+        """With full, every item is enriched again, as if the store were empty.
+        account is the store's name for the seller account of client."""
+
+        self.client = client
+        self.store = store
+        self.account = account
+        self.known = {} if full else store.open_items(account)
+        self.seen = {}
+        self.orders_seen = 0
+        self.new_items = 0
+        self.changed_items = 0
+        self.complete = False
+
+    def is_new(self, order_item_id):
+        return order_item_id not in self.known
+
+    def orders(self, orders):
+        """Yield the order dicts of orders as Orders with only their new and changed items."""
+
+        for order in orders:
+            self.orders_seen += 1
+            order = Order.from_json(order)
+            items = []
+            changed = False
+            for item in order.items:
+                self.seen[item.order_item_id] = item.latest_change
+                if item.order_item_id not in self.known:
+                    self.new_items += 1
+                elif item.latest_change is not None and item.latest_change != self.known[item.order_item_id]:
+                    self.changed_items += 1
+                    changed = True
+                else:
+                    continue
+                items.append(item)
+            if not items:
+                continue
+            if changed:
+                # the cached details are from before the change
+                self.client.order_cache.invalidate(order.order_id)
+            order.items = items
+            yield order
+        # only reached when the page iterator ended without raising
+        self.complete = True
+
+    def finish(self):
+        """Mark the items that left the OPEN list as CLOSED, returning how many.
+
+        Does nothing unless orders() read the order list to the end: items
+        missing from a list that was cut short may well still be open.
+        """
+
+        if not self.complete:
+            return 0
+        return self.store.mark_closed(self.seen, self.account)
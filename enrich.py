@@ -0,0 +1,95 @@
+"""
+Order enrichment: turns open orders into dashboard rows.
+
+Runs without the GUI, so it can be used and benchmarked on its own.
+"""
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from models import Address, Order, OrderLine, Product
+
+_WARNINGS = {
+    'no_title_warning': "Warning: No title found for EAN {}",
+    'no_brand_warning': "Warning: No brand found for EAN {}",
+}
+
+
+def _print_warning(key, ean):
+    print(_WARNINGS[key].format(ean))
+
+
+class OrderEnricher(object):
+    """Enriches orders with product and customer details on bounded worker pools.
+
+    Order and product lookups run concurrently, but rows are yielded in the
+    order of the input orders and their items, so the output is stable.
+    """
+
+    def __init__(self, client, order_workers=4, product_workers=4, max_pending=100, warn=None):
+        """warn(key, ean) is called for missing titles and brands, key being
+        'no_title_warning' or 'no_brand_warning'."""
+
+        self.client = client
+        self.order_workers = order_workers
+        self.product_workers = product_workers
+        self.max_pending = max_pending
+        self.warn = warn or _print_warning
+
+    def _product(self, ean):
+        title, brand, description = self.client._product_info(ean)
+        if title is None or title == "":
+            self.warn('no_title_warning', ean)
+        if not brand:
+            brand = "Merkloos"
+            self.warn('no_brand_warning', ean)
+        return Product(ean, title, brand, description)
+
+    def _rows(self, order, details, products):
+        customer = Address.from_json(details.get('shipmentDetails'))
+        for item, product in zip(order.items, products):
+            yield item.order_item_id, OrderLine.build(order, item, product.result(), customer).to_row()
+
+    def enrich(self, orders):
+        """Yield (orderItemId, row) for every item of orders, in input order.
+
+        orders may be any iterable of Orders or order dicts from the API,
+        including a lazy page iterator; at most max_pending orders are looked
+        up ahead of the one being yielded.
+        Closing the generator cancels the lookups that have not started yet.
+        """
+
+        with ThreadPoolExecutor(self.order_workers) as order_pool, \
+                ThreadPoolExecutor(self.product_workers) as product_pool:
+            products = {}
+            pending = deque()
+            try:
+                for order in orders:
+                    if not isinstance(order, Order):
+                        order = Order.from_json(order)
+                    details = order_pool.submit(self.client._order, order.order_id)
+                    items = []
+                    for item in order.items:
+                        if item.ean not in products:
+                            products[item.ean] = product_pool.submit(self._product, item.ean)
+                        items.append(products[item.ean])
+                    pending.append((order, details, items))
+
+                    while len(pending) > self.max_pending or (pending and pending[0][1].done()):
+                        head, details, items = pending.popleft()
+                        yield from self._rows(head, details.result(), items)
+
+                while pending:
+                    head, details, items = pending.popleft()
+                    yield from self._rows(head, details.result(), items)
+            finally:
+                # when the consumer stops early, don't wait for lookups nobody needs
+                for _, details, items in pending:
+                    details.cancel()
+                for future in products.values():
+                    future.cancel()
+
+    def enrich_rows(self, orders):
+        """Return the rows for orders as a list."""
+
+        return [row for _, row in self.enrich(orders)]
@@ -0,0 +1,243 @@
+"""
+Order history export for analytics: JSON lines, and Parquet when pyarrow is installed.
+
+Items are exported from the order store in the order they were stored, a
+chunk at a time, into a folder per month and files per order date:
+
+    export/2024-05/orders-2024-05-19.jsonl
+    export/2024-05/orders-2024-05-19-000042.parquet   (one per chunk)
+
+checkpoint.json records the last exported orderItemId, its sequence number
+in the store and the size of every file at that point. An export that was
+interrupted is cut back to its last checkpoint and continues from there, so
+there are no partial or duplicate records. Rows imported from orders.csv are
+left out until a sync replaces them with the real order item.
+
+    python export.py --db orders.db --dir export
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # Parquet is optional, JSON lines always work
+    pyarrow = None
+
+from models import OrderLine
+from store import OrderStore
+
+JSONL = "jsonl"
+PARQUET = "parquet"
+
+FIELDS = ('order_item_id', 'account') + OrderLine.__slots__
+
+_UNDATED = "undated"
+
+
+def _partition(order_date):
+    """Return the (month, day) folder and file an order date belongs to."""
+
+    if not order_date or len(order_date) < 10:
+        return _UNDATED, _UNDATED
+    return order_date[:7], order_date[:10]
+
+
+def _quantity(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def to_record(order_item_id, account, row):
+    """Return an order store row as a dict with the FIELDS as keys."""
+
+    line = OrderLine.from_row(row)
+    record = {'order_item_id': order_item_id, 'account': account}
+    for field in OrderLine.__slots__:
+        record[field] = getattr(line, field)
+    record['quantity'] = _quantity(record['quantity'])
+    return record
+
+
+def _schema():
+    return pyarrow.schema([(field, pyarrow.int64() if field == 'quantity' else pyarrow.string()) for field in FIELDS])
+
+
+class OrderExport(object):
+    """Appends the items of an OrderStore to a dated export directory.
+
+    Call export(store) as often as convenient, e.g. after every batch a sync
+    stores; it only writes what was stored since the previous call. An item
+    is exported once, when it is first stored. Rows imported from orders.csv
+    are not exported, as they have no orderItemId; the item that replaces
+    one is. Thread-safe, so several sync engines can share one.
+    """
+
+    def __init__(self, directory="export", formats=None, chunk_size=1000, fsync=True):
+        """formats is a sequence of JSONL and PARQUET, by default both if
+        pyarrow is installed. chunk_size is the number of items per write and
+        checkpoint; every chunk adds a Parquet file per order date in it."""
+
+        if formats is None:
+            formats = (JSONL, PARQUET) if pyarrow is not None else (JSONL,)
+        if PARQUET in formats and pyarrow is None:
+            raise RuntimeError("The Parquet export needs pyarrow (pip install pyarrow)")
+        self.directory = directory
+        self.formats = tuple(formats)
+        self.chunk_size = chunk_size
+        self.fsync = fsync
+        self.checkpoint_path = os.path.join(directory, "checkpoint.json")
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self.checkpoint = self._load_checkpoint()
+        self._repair()
+
+    def _load_checkpoint(self):
+        try:
+            with open(self.checkpoint_path, "r") as f:
+                checkpoint = json.load(f)
+            checkpoint.setdefault('seq', checkpoint.pop('rowid', 0))  # a store's seq starts out as its rowid
+            return checkpoint
+        except (OSError, ValueError):
+            return {'order_item_id': None, 'seq': 0, 'exported': 0, 'chunks': 0, 'files': {}}
+
+    def _save_checkpoint(self, checkpoint):
+        tmp = self.checkpoint_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(checkpoint, f)
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+        os.replace(tmp, self.checkpoint_path)
+        self.checkpoint = checkpoint
+
+    def _repair(self):
+        """Undo whatever an interrupted export wrote after its last checkpoint."""
+
+        files = self.checkpoint['files']
+        for month in os.listdir(self.directory):
+            folder = os.path.join(self.directory, month)
+            if not os.path.isdir(folder):
+                continue
+            for name in os.listdir(folder):
+                key = month + "/" + name
+                path = os.path.join(folder, name)
+                if key not in files:
+                    if name.endswith((".jsonl", ".parquet", ".tmp")):
+                        os.remove(path)
+                elif os.path.getsize(path) > files[key]:
+                    with open(path, "r+b") as f:
+                        f.truncate(files[key])
+
+    @property
+    def last_order_item_id(self):
+        return self.checkpoint['order_item_id']
+
+    def export(self, store):
+        """Export the items stored since the last export, returning how many there were."""
+
+        with self._lock:
+            count = 0
+            while True:
+                items = store.items_after(self.checkpoint['seq'], self.chunk_size)
+                if not items:
+                    return count
+                self._write(items)
+                count += len(items)
+
+    def _write(self, items):
+        dates = {}
+        for seq, order_item_id, account, row in items:
+            dates.setdefault(_partition(row[1]), []).append(to_record(order_item_id, account, row))
+        chunk = self.checkpoint['chunks'] + 1
+        files = dict(self.checkpoint['files'])
+        for (month, day), records in sorted(dates.items()):
+            os.makedirs(os.path.join(self.directory, month), exist_ok=True)
+            name = "%s/orders-%s" % (month, day)
+            if JSONL in self.formats:
+                files[name + ".jsonl"] = self._append_jsonl(name + ".jsonl", records)
+            if PARQUET in self.formats:
+                key = "%s-%06d.parquet" % (name, chunk)
+                files[key] = self._write_parquet(key, records)
+        seq, order_item_id = items[-1][0], items[-1][1]
+        self._save_checkpoint({
+            'order_item_id': order_item_id,
+            'seq': seq,
+            'exported': self.checkpoint['exported'] + len(items),
+            'chunks': chunk,
+            'files': files,
+        })
+
+    def _path(self, key):
+        return os.path.join(self.directory, *key.split("/"))
+
+    def _append_jsonl(self, key, records):
+        data = "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records).encode("utf-8")
+        with open(self._path(key), "ab") as f:
+            f.write(data)
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+            return f.tell()
+
+    def _write_parquet(self, key, records):
+        path = self._path(key)
+        table = pyarrow.Table.from_pylist(records, schema=_schema())
+        pyarrow.parquet.write_table(table, path + ".tmp")
+        os.replace(path + ".tmp", path)
+        return os.path.getsize(path)
+
+
+def read(directory="export", start=None, end=None):
+    """Yield the exported records with start <= order date < end.
+
+    start and end are YYYY-MM-DD (or YYYY-MM) strings and may be None; only
+    the JSON lines files of those dates are read. Records without an order
+    date only come with neither bound.
+    """
+
+    for month in sorted(os.listdir(directory)):
+        folder = os.path.join(directory, month)
+        if not os.path.isdir(folder):
+            continue
+        if month == _UNDATED:
+            if start or end:
+                continue
+        elif (start and month < start[:7]) or (end and month > end[:7]):
+            continue
+        for name in sorted(os.listdir(folder)):
+            if not (name.startswith("orders-") and name.endswith(".jsonl")):
+                continue
+            day = name[len("orders-"):-len(".jsonl")]
+            if day != _UNDATED and ((start and day < start) or (end and day >= end)):
+                continue
+            with open(os.path.join(folder, name), "r", encoding="utf-8") as f:
+                for line in f:
+                    yield json.loads(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export the order store for analytics, continuing where the last export stopped.")
+    parser.add_argument("--db", default="orders.db", help="order store (default orders.db)")
+    parser.add_argument("--dir", default="export", help="export directory (default export)")
+    parser.add_argument("--format", action="append", choices=(JSONL, PARQUET),
+                        help="jsonl or parquet, may be repeated (default both if pyarrow is installed)")
+    args = parser.parse_args(argv)
+
+    try:
+        export = OrderExport(args.dir, formats=args.format)
+    except RuntimeError as e:
+        parser.error(str(e))
+    count = export.export(OrderStore(args.db))
+    print(json.dumps({'exported': count, 'last_order_item_id': export.last_order_item_id}))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,209 @@
+"""
+Request metrics for the Client: counts, latencies and sizes per endpoint group.
+"""
+
+import json
+import threading
+from bisect import bisect_left
+
+from ratelimit import endpoint_group
+
+# upper bounds in seconds, as Prometheus histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class _Endpoint(object):
+    __slots__ = ('requests', 'in_flight', 'errors', 'statuses', 'bytes', 'latency_sum', 'buckets')
+
+    def __init__(self, bucket_count):
+        self.requests = 0
+        self.in_flight = 0
+        self.errors = 0
+        self.statuses = {}
+        self.bytes = 0
+        self.latency_sum = 0.0
+        self.buckets = [0] * (bucket_count + 1)  # the last one is +Inf
+
+
+class RequestMetrics(object):
+    """Collects per-endpoint request metrics through the hooks of a Client.
+
+    Use attach(client), or pass metrics=RequestMetrics() to the Client.
+    Every HTTP attempt counts, including the retry after a 401 and retries
+    by the rate-limit scheduler. Logins are taken from the client's token
+    manager.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.bucket_bounds = tuple(buckets)
+        self.unauthorized = 0
+        self.client = None
+        self._endpoints = {}
+        self._lock = threading.Lock()
+
+    def attach(self, client):
+        """Register the hooks on client; returns self."""
+
+        self.client = client
+        client.metrics = self
+        client.request_hooks.append(self.on_request)
+        client.response_hooks.append(self.on_response)
+        return self
+
+    def _endpoint(self, method, url):
+        group = endpoint_group(method, url)
+        endpoint = self._endpoints.get(group)
+        if endpoint is None:
+            endpoint = self._endpoints[group] = _Endpoint(len(self.bucket_bounds))
+        return endpoint
+
+    def on_request(self, method, url):
+        with self._lock:
+            endpoint = self._endpoint(method, url)
+            endpoint.requests += 1
+            endpoint.in_flight += 1
+
+    def on_response(self, method, url, status, size, elapsed):
+        """Record a finished request; status is None when it raised."""
+
+        with self._lock:
+            endpoint = self._endpoint(method, url)
+            endpoint.in_flight -= 1
+            endpoint.latency_sum += elapsed
+            endpoint.buckets[bisect_left(self.bucket_bounds, elapsed)] += 1
+            if status is None:
+                endpoint.errors += 1
+                return
+            endpoint.statuses[status] = endpoint.statuses.get(status, 0) + 1
+            endpoint.bytes += size
+            if status == 401:
+                self.unauthorized += 1
+
+    def quantile(self, buckets, fraction):
+        """Estimate a latency quantile as the upper bound of the bucket it falls in."""
+
+        total = sum(buckets)
+        if not total:
+            return None
+        seen = 0
+        for bound, count in zip(self.bucket_bounds + (float('inf'),), buckets):
+            seen += count
+            if seen >= fraction * total:
+                return bound
+        return float('inf')
+
+    def snapshot(self):
+        """Return all metrics as a dict that json.dumps accepts."""
+
+        with self._lock:
+            endpoints = {}
+            for group, endpoint in sorted(self._endpoints.items()):
+                endpoints[group] = {
+                    'requests': endpoint.requests,
+                    'in_flight': endpoint.in_flight,
+                    'errors': endpoint.errors,
+                    'statuses': {str(status): count for status, count in sorted(endpoint.statuses.items())},
+                    'bytes': endpoint.bytes,
+                    'latency': {
+                        'sum': endpoint.latency_sum,
+                        'p50': self.quantile(endpoint.buckets, 0.50),
+                        'p99': self.quantile(endpoint.buckets, 0.99),
+                        'buckets': list(endpoint.buckets),
+                    },
+                }
+            snapshot = {
+                'bucket_bounds': list(self.bucket_bounds),
+                'endpoints': endpoints,
+                'unauthorized': self.unauthorized,
+            }
+        if self.client is not None:
+            snapshot['logins'] = self.client.tokens.logins
+        return snapshot
+
+    def to_json(self, **kwargs):
+        # JSON has no Infinity; a p99 above the last bucket becomes null
+        snapshot = self.snapshot()
+        for endpoint in snapshot['endpoints'].values():
+            for key in ('p50', 'p99'):
+                if endpoint['latency'][key] == float('inf'):
+                    endpoint['latency'][key] = None
+        return json.dumps(snapshot, **kwargs)
+
+    def to_prometheus(self, prefix="bol"):
+        """Return the metrics in the Prometheus text exposition format."""
+
+        snapshot = self.snapshot()
+        endpoints = snapshot['endpoints']
+        lines = [
+            "# HELP %s_requests_total HTTP requests sent to the Retailer API." % prefix,
+            "# TYPE %s_requests_total counter" % prefix,
+        ]
+        for group, endpoint in endpoints.items():
+            for status, count in endpoint['statuses'].items():
+                lines.append('%s_requests_total{endpoint="%s",status="%s"} %d' % (prefix, group, status, count))
+        lines += [
+            "# HELP %s_request_errors_total Requests that failed without a response." % prefix,
+            "# TYPE %s_request_errors_total counter" % prefix,
+        ]
+        lines += ['%s_request_errors_total{endpoint="%s"} %d' % (prefix, group, endpoint['errors'])
+                  for group, endpoint in endpoints.items()]
+        lines += [
+            "# HELP %s_requests_in_flight Requests waiting for a response." % prefix,
+            "# TYPE %s_requests_in_flight gauge" % prefix,
+        ]
+        lines += ['%s_requests_in_flight{endpoint="%s"} %d' % (prefix, group, endpoint['in_flight'])
+                  for group, endpoint in endpoints.items()]
+        lines += [
+            "# HELP %s_response_bytes_total Bytes of response bodies." % prefix,
+            "# TYPE %s_response_bytes_total counter" % prefix,
+        ]
+        lines += ['%s_response_bytes_total{endpoint="%s"} %d' % (prefix, group, endpoint['bytes'])
+                  for group, endpoint in endpoints.items()]
+        lines += [
+            "# HELP %s_request_duration_seconds Request latency." % prefix,
+            "# TYPE %s_request_duration_seconds histogram" % prefix,
+        ]
+        for group, endpoint in endpoints.items():
+            latency = endpoint['latency']
+            cumulative = 0
+            for bound, count in zip(snapshot['bucket_bounds'] + ["+Inf"], latency['buckets']):
+                cumulative += count
+                lines.append('%s_request_duration_seconds_bucket{endpoint="%s",le="%s"} %d' % (prefix, group, bound, cumulative))
+            lines.append('%s_request_duration_seconds_sum{endpoint="%s"} %f' % (prefix, group, latency['sum']))
+            lines.append('%s_request_duration_seconds_count{endpoint="%s"} %d' % (prefix, group, cumulative))
+        lines += [
+            "# HELP %s_unauthorized_total 401 responses, each followed by a new login and a retry." % prefix,
+            "# TYPE %s_unauthorized_total counter" % prefix,
+            "%s_unauthorized_total %d" % (prefix, snapshot['unauthorized']),
+        ]
+        if 'logins' in snapshot:
+            lines += [
+                "# HELP %s_logins_total Tokens requested." % prefix,
+                "# TYPE %s_logins_total counter" % prefix,
+                "%s_logins_total %d" % (prefix, snapshot['logins']),
+            ]
+        return "\n".join(lines) + "\n"
+
+    def format_table(self):
+        """Return the metrics as a plain text table, for the dashboard."""
+
+        snapshot = self.snapshot()
+        lines = ["%-16s %8s %7s %6s %10s %8s %8s" % ("endpoint", "requests", "errors", "401", "kB", "p50", "p99")]
+        for group, endpoint in snapshot['endpoints'].items():
+            latency = endpoint['latency']
+            lines.append("%-16s %8d %7d %6d %10.1f %8s %8s" % (
+                group, endpoint['requests'], endpoint['errors'], endpoint['statuses'].get('401', 0),
+                endpoint['bytes'] / 1024.0, _format_seconds(latency['p50']), _format_seconds(latency['p99'])))
+        lines.append("")
+        lines.append("401 responses: %d" % snapshot['unauthorized'])
+        if 'logins' in snapshot:
+            lines.append("logins: %d" % snapshot['logins'])
+        return "\n".join(lines)
+
+
+def _format_seconds(seconds):
+    if seconds is None:
+        return "-"
+    if seconds == float('inf'):
+        return "> %gs" % LATENCY_BUCKETS[-1]
+    return "<= %gs" % seconds
@@ -0,0 +1,167 @@
+"""
+Typed records for orders, order items, products and addresses.
+
+API responses are parsed into these once. Values that repeat across many
+records (EANs, brands, countries, cities, fulfilment methods) are interned,
+so every record refers to the same string object.
+"""
+
+import sys
+
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def fulfilment_label(method):
+    """Map bol's fulfilment method to the label used in the dashboard."""
+
+    if method == "FBR":
+        return "VVB"
+    return method
+
+
+class Address(object):
+    """Shipment or billing details of an order."""
+
+    __slots__ = ('first_name', 'surname', 'street', 'house_number', 'extension', 'zip_code', 'city', 'country')
+
+    def __init__(self, first_name='N/A', surname='N/A', street='N/A', house_number='N/A', extension='',
+                 zip_code='N/A', city='N/A', country='N/A'):
+        self.first_name = first_name
+        self.surname = surname
+        self.street = street
+        self.house_number = house_number
+        self.extension = extension
+        self.zip_code = zip_code
+        self.city = _intern(city)
+        self.country = _intern(country)
+
+    @classmethod
+    def from_json(cls, details):
+        details = details or {}
+        return cls(
+            details.get('firstName', 'N/A'),
+            details.get('surname', 'N/A'),
+            details.get('streetName', 'N/A'),
+            details.get('houseNumber', 'N/A'),
+            details.get('houseNumberExtension', ''),
+            details.get('zipCode', 'N/A'),
+            details.get('city', 'N/A'),
+            details.get('countryCode', 'N/A'),
+        )
+
+    @property
+    def name(self):
+        return f"{self.first_name} {self.surname}"
+
+    @property
+    def street_address(self):
+        return f"{self.street} {self.house_number} {self.extension}"
+
+    def customer_fields(self):
+        """Return (name, address, city, postal code, country) as shown in the orders view."""
+
+        return self.name, self.street_address, self.city, self.zip_code, self.country
+
+
+class OrderItem(object):
+    __slots__ = ('order_item_id', 'ean', 'quantity', 'fulfilment_method', 'latest_change')
+
+    def __init__(self, order_item_id, ean, quantity=1, fulfilment_method=None, latest_change=None):
+        self.order_item_id = order_item_id
+        self.ean = _intern(ean)
+        self.quantity = quantity
+        self.fulfilment_method = _intern(fulfilment_method)
+        self.latest_change = latest_change
+
+    @classmethod
+    def from_json(cls, item):
+        return cls(item.get('orderItemId'), item['ean'], item.get('quantity', 1), item.get('fulfilmentMethod'),
+                   item.get('latestChangedDateTime'))
+
+
+class Order(object):
+    """An order from /orders or /orders/{id}; the addresses are only in the latter."""
+
+    __slots__ = ('order_id', 'placed', 'items', 'shipment', 'billing')
+
+    def __init__(self, order_id, placed=None, items=(), shipment=None, billing=None):
+        self.order_id = order_id
+        self.placed = placed
+        self.items = list(items)
+        self.shipment = shipment
+        self.billing = billing
+
+    @classmethod
+    def from_json(cls, order):
+        return cls(
+            order['orderId'],
+            order.get('orderPlacedDateTime'),
+            [OrderItem.from_json(item) for item in order.get('orderItems', [])],
+            Address.from_json(order['shipmentDetails']) if 'shipmentDetails' in order else None,
+            Address.from_json(order['billingDetails']) if 'billingDetails' in order else None,
+        )
+
+
+class Product(object):
+    __slots__ = ('ean', 'title', 'brand', 'description')
+
+    def __init__(self, ean, title=None, brand=None, description=None):
+        self.ean = _intern(ean)
+        self.title = title
+        self.brand = _intern(brand)
+        self.description = description
+
+
+class OrderLine(object):
+    """One order item as a row of the orders view, orders.csv and the order store.
+
+    Fields are in column order; to_row() and from_row() convert to and from
+    the 12-column list.
+    """
+
+    __slots__ = ('order_id', 'order_date', 'ean', 'quantity', 'product', 'brand', 'fulfilment_method',
+                 'customer_name', 'customer_address', 'city', 'postal_code', 'country')
+
+    def __init__(self, order_id, order_date, ean, quantity, product, brand, fulfilment_method,
+                 customer_name, customer_address, city, postal_code, country):
+        self.order_id = order_id
+        self.order_date = order_date
+        self.ean = _intern(ean)
+        self.quantity = quantity
+        self.product = product
+        self.brand = _intern(brand)
+        self.fulfilment_method = _intern(fulfilment_method)
+        self.customer_name = customer_name
+        self.customer_address = customer_address
+        self.city = _intern(city)
+        self.postal_code = postal_code
+        self.country = _intern(country)
+
+    @classmethod
+    def build(cls, order, item, product, customer):
+        """Combine an Order, one of its OrderItems, its Product and the customer's Address."""
+
+        return cls(order.order_id, order.placed, item.ean, item.quantity, product.title, product.brand,
+                   fulfilment_label(item.fulfilment_method), *customer.customer_fields())
+
+    @classmethod
+    def from_row(cls, row):
+        values = list(row[:12])
+        values += [None] * (12 - len(values))
+        return cls(*values)
+
+    @classmethod
+    def from_csv(cls, row):
+        """Read a row of orders.csv, where every value is text."""
+
+        line = cls.from_row(row)
+        if isinstance(line.quantity, str) and line.quantity.isdigit():
+            line.quantity = int(line.quantity)
+        return line
+
+    def to_row(self):
+        return [self.order_id, self.order_date, self.ean, self.quantity, self.product, self.brand,
+                self.fulfilment_method, self.customer_name, self.customer_address, self.city,
+                self.postal_code, self.country]
@@ -0,0 +1,90 @@
+"""
+Offers export: our whole catalog in one CSV report, instead of a request per EAN.
+"""
+
+import csv
+import io
+import time
+
+from client import is_problem
+from process_status import SUCCESS, ProcessStatusTracker
+
+
+def iter_offers(lines):
+    """Parse an offers export from an iterable of text lines, yielding one dict per offer.
+
+    The keys are the export's column names, such as offerId, ean,
+    bundlePricesPrice and stockAmount.
+    """
+
+    return csv.DictReader(lines)
+
+
+def article_row(offer, info=None):
+    """Row for the articles view: EAN, title, brand, stock and price.
+
+    info is the (title, brand, description) record from the product cache, if
+    there is one; the export itself has no titles or brands.
+    """
+
+    title, brand = (info[0], info[1]) if info else ("", "")
+    return [offer.get('ean'), title or "", brand or "", offer.get('stockAmount'), offer.get('bundlePricesPrice')]
+
+
+class OfferExport(object):
+    """Requests an offers export, waits for bol to prepare it and streams the report.
+
+    Offers are stored in the client's product cache as they are read; offers
+    that were not in a completely read export are removed from it.
+    """
+
+    def __init__(self, client, tracker=None, timeout=600.0, batch_size=500):
+        """timeout is how long to wait for the export, batch_size the number of
+        offers written to the product cache at once."""
+
+        self.client = client
+        self.tracker = tracker if tracker is not None else ProcessStatusTracker(client, interval=2.0)
+        self.timeout = timeout
+        self.batch_size = batch_size
+
+    def request(self):
+        """Request an export and wait until it is ready, returning its report id."""
+
+        response = self.client._request_offer_export()
+        if is_problem(response) or 'processStatusId' not in response:
+            raise RuntimeError("Offer export failed: %s" % (response.get('detail') or response.get('title')))
+        process_status_id = self.tracker.add(response)
+        self.tracker.wait(self.timeout)
+        status = self.tracker.forget(process_status_id)
+        if status.get('status') != SUCCESS:
+            raise RuntimeError("Offer export failed: %s" % (status.get('errorMessage') or status.get('status')))
+        return status['entityId']
+
+    def offers(self, report_id):
+        """Yield the offers of a prepared export, reading the report as it downloads."""
+
+        cache = self.client.product_cache
+        response = self.client._offer_export(report_id)
+        try:
+            if response.status_code != 200:
+                raise RuntimeError("Offer export failed: HTTP %d" % response.status_code)
+            response.raw.decode_content = True
+            response.raw.auto_close = False  # otherwise it reports closed before the last line is parsed
+            lines = io.TextIOWrapper(response.raw, encoding=response.encoding or "utf-8-sig", newline="")
+            exported = time.time()
+            batch = []
+            for offer in iter_offers(lines):
+                batch.append(offer)
+                if len(batch) >= self.batch_size:
+                    cache.put_offers(batch, exported)
+                    batch = []
+                yield offer
+            cache.put_offers(batch, exported)
+            cache.drop_offers_before(exported)
+        finally:
+            response.close()
+
+    def run(self):
+        """Request an export and yield its offers."""
+
+        yield from self.offers(self.request())
@@ -0,0 +1,71 @@
+"""
+Tracking of bol's asynchronous process statuses.
+
+Many write calls (shipments, offer exports) only return a process status;
+the outcome has to be polled from /shared/process-status.
+"""
+
+import time
+
+PENDING = "PENDING"
+SUCCESS = "SUCCESS"
+FAILURE = "FAILURE"
+TIMEOUT = "TIMEOUT"
+
+_BATCH_SIZE = 1000
+
+
+class ProcessStatusTracker(object):
+    """Polls many process statuses in bulk until they are resolved.
+
+    Statuses are queried in batches of up to 1000 per request; the polling
+    interval grows from interval to max_interval while work is pending.
+    """
+
+    def __init__(self, client, interval=1.0, max_interval=30.0, timeout=600.0):
+        self.client = client
+        self.interval = interval
+        self.max_interval = max_interval
+        self.timeout = timeout
+        self.statuses = {}
+
+    def add(self, process_status):
+        """Track a process status as returned by a write call, returning its id."""
+
+        process_status_id = str(process_status['processStatusId'])
+        self.statuses[process_status_id] = process_status
+        return process_status_id
+
+    def forget(self, process_status_id):
+        """Stop tracking a process status, returning its last known state."""
+
+        return self.statuses.pop(str(process_status_id))
+
+    def pending(self):
+        return [i for i, status in self.statuses.items() if status.get('status') == PENDING]
+
+    def poll(self):
+        """Query all pending statuses once, returning the number still pending."""
+
+        pending = self.pending()
+        for start in range(0, len(pending), _BATCH_SIZE):
+            for status in self.client._process_statuses(pending[start:start + _BATCH_SIZE]):
+                self.statuses[str(status['processStatusId'])] = status
+        return len(self.pending())
+
+    def wait(self, timeout=None):
+        """Poll with backoff until nothing is pending or timeout seconds passed.
+
+        Returns the statuses by processStatusId; unresolved ones stay PENDING.
+        """
+
+        deadline = time.monotonic() + (self.timeout if timeout is None else timeout)
+        interval = self.interval
+        while self.pending():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            time.sleep(min(interval, remaining))
+            self.poll()
+            interval = min(self.max_interval, interval * 1.5)
+        return self.statuses
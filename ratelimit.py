@@ -0,0 +1,215 @@
+"""
+Rate-limit aware request scheduling for the Bol.com API.
+
+bol limits requests per endpoint group and reports the budget in the
+X-RateLimit-* response headers; a 429 comes with a Retry-After header.
+"""
+
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+
+RETRY_STATUSES = {500, 502, 503, 504}
+IDEMPOTENT_METHODS = {'GET', 'PUT', 'DELETE', 'HEAD'}
+
+
+def endpoint_group(method, url):
+    """Return the rate-limit group a request belongs to."""
+
+    path = urlsplit(url).path
+    for prefix in ("/retailer-demo", "/retailer"):
+        if path.startswith(prefix):
+            path = path[len(prefix):]
+            break
+    parts = [part for part in path.split("/") if part]
+
+    if not parts:
+        return "other"
+    if parts[0] == "orders":
+        if parts[-1] == "shipment":
+            return "shipments"
+        return "orders-list" if len(parts) == 1 else "orders"
+    if parts[0] == "shared" and len(parts) > 1:
+        return parts[1]
+    if parts[0] == "offers" and len(parts) > 1 and parts[1] == "export":
+        return "offers-export"
+    return parts[0]
+
+
+class TokenBucket(object):
+    """Token bucket that paces requests and adapts to the limits bol reports."""
+
+    def __init__(self, rate=10.0, capacity=10.0):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.blocked_until = 0.0
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _fill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self):
+        """Take a token if one is available, returning 0, or else the seconds to wait."""
+
+        with self._lock:
+            now = time.monotonic()
+            self._fill(now)
+            if now >= self.blocked_until and self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+            return max(self.blocked_until - now, (1 - self.tokens) / self.rate)
+
+    def acquire(self):
+        """Block until a request may be sent, returning the seconds waited."""
+
+        waited = 0.0
+        delay = self.reserve()
+        while delay > 0:
+            time.sleep(delay)
+            waited += delay
+            delay = self.reserve()
+        return waited
+
+    def observe(self, limit=None, remaining=None, reset=None):
+        """Calibrate the bucket from the X-RateLimit-* headers of a response."""
+
+        with self._lock:
+            now = time.monotonic()
+            self._fill(now)
+            if limit:
+                self.capacity = float(limit)
+            if remaining is not None:
+                self.tokens = min(self.tokens, float(remaining))
+                if reset:
+                    # spread what is left of the window over the time until it resets
+                    self.rate = max(remaining, 1) / reset
+                    if remaining <= 0:
+                        self.blocked_until = max(self.blocked_until, now + reset)
+
+    def block(self, seconds):
+        """Stop handing out tokens for the next seconds, e.g. after a 429."""
+
+        with self._lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+            self.tokens = 0.0
+
+
+def header_number(headers, name):
+    try:
+        return float(headers[name])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+class RequestScheduler(object):
+    """Sends requests through per-endpoint-group token buckets.
+
+    Honours Retry-After on 429 responses and retries 5xx responses and
+    connection errors with jittered exponential backoff. Non-idempotent
+    requests (POST) are only retried when bol reports they were not handled
+    (429 and 503).
+    """
+
+    def __init__(self, rate=10.0, max_retries=5, backoff=0.5, max_backoff=30.0):
+        self.rate = rate
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._buckets = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, group):
+        with self._lock:
+            if group not in self._buckets:
+                self._buckets[group] = TokenBucket(self.rate, self.rate)
+                self._stats[group] = {'requests': 0, 'throttled': 0, 'retries': 0, 'errors': 0, 'waited': 0.0}
+            return self._buckets[group]
+
+    def record(self, group, key, amount=1):
+        """Add amount to the statistic key of group."""
+
+        with self._lock:
+            self._stats[group][key] += amount
+
+    def backoff_delay(self, attempt):
+        """Return the jittered backoff before retry number attempt."""
+
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    def retry_delay(self, method, group, attempt, status=None, headers=None):
+        """Record the outcome of attempt number attempt and decide whether to retry it.
+
+        status and headers are those of the response, or None if the request
+        failed with a connection error. Returns None if the response is final
+        (or the error should be raised), else the seconds to back off first.
+        """
+
+        bucket = self.bucket(group)
+        retry_errors = method.upper() in IDEMPOTENT_METHODS
+        if status is None:
+            self.record(group, 'errors')
+            if not retry_errors or attempt >= self.max_retries:
+                return None
+            self.record(group, 'retries')
+            return self.backoff_delay(attempt)
+
+        bucket.observe(
+            header_number(headers, 'X-RateLimit-Limit'),
+            header_number(headers, 'X-RateLimit-Remaining'),
+            header_number(headers, 'X-RateLimit-Reset')
+        )
+        if status == 429:
+            self.record(group, 'throttled')
+            retry_after = header_number(headers, 'Retry-After')
+            bucket.block(retry_after if retry_after is not None else 1.0)
+        elif status in RETRY_STATUSES:
+            self.record(group, 'errors')
+            if not (retry_errors or status == 503):
+                return None
+        else:
+            return None
+
+        if attempt >= self.max_retries:
+            return None
+        self.record(group, 'retries')
+        return 0.0 if status == 429 else self.backoff_delay(attempt)  # after a 429 the bucket waits
+
+    def send(self, method, url, send):
+        """Call send() for a request to url once the rate limit allows it, retrying as needed."""
+
+        group = endpoint_group(method, url)
+        bucket = self.bucket(group)
+
+        attempt = 0
+        while True:
+            self.record(group, 'waited', bucket.acquire())
+            self.record(group, 'requests')
+            try:
+                response = send()
+            except (requests.ConnectionError, requests.Timeout):
+                delay = self.retry_delay(method, group, attempt)
+                if delay is None:
+                    raise
+            else:
+                delay = self.retry_delay(method, group, attempt, response.status_code, response.headers)
+                if delay is None:
+                    return response
+                response.close()  # a streamed body would hold on to its connection
+            time.sleep(delay)
+            attempt += 1
+
+    def stats(self):
+        """Return throttling statistics per endpoint group."""
+
+        with self._lock:
+            stats = {group: dict(values) for group, values in self._stats.items()}
+            for group, bucket in self._buckets.items():
+                stats[group]['rate'] = bucket.rate
+        return stats
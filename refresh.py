@@ -0,0 +1,95 @@
+"""
+Background order refresh, so the GUI thread never waits on the network.
+"""
+
+import threading
+
+from offers import article_row
+
+ROW = "row"
+DONE = "done"
+CANCELLED = "cancelled"
+ERROR = "error"
+
+
+class RefreshWorker(threading.Thread):
+    """Runs one refresh on a daemon thread and reports through a queue.
+
+    Posts (ROW, orderItemId, row) for every enriched row as soon as it is
+    ready, followed by exactly one of (DONE, count), (CANCELLED, count) or
+    (ERROR, exception). With a delta.DeltaRefresh only new and changed items
+    are enriched.
+    """
+
+    def __init__(self, client, enricher, messages, delta=None):
+        super().__init__(daemon=True)
+        self.client = client
+        self.enricher = enricher
+        self.messages = messages
+        self.delta = delta
+        self._cancel = threading.Event()
+
+    def cancel(self):
+        self._cancel.set()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def run(self):
+        count = 0
+        orders = self.client.iter_orders()
+        if self.delta is not None:
+            orders = self.delta.orders(orders)
+        rows = self.enricher.enrich(orders)
+        try:
+            for order_item_id, row in rows:
+                if self.cancelled:
+                    break
+                self.messages.put((ROW, order_item_id, row))
+                count += 1
+        except Exception as e:
+            self.messages.put((ERROR, e))
+            return
+        finally:
+            rows.close()
+        self.messages.put((CANCELLED if self.cancelled else DONE, count))
+
+
+class OfferExportWorker(threading.Thread):
+    """Runs an offers.OfferExport on a daemon thread and reports through a queue.
+
+    Posts (ROW, offerId, row) for every offer, with the row in the layout of
+    offers.article_row(), followed by one of (DONE, count), (CANCELLED, count)
+    or (ERROR, exception).
+    """
+
+    def __init__(self, export, messages):
+        super().__init__(daemon=True)
+        self.export = export
+        self.messages = messages
+        self._cancel = threading.Event()
+
+    def cancel(self):
+        self._cancel.set()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def run(self):
+        count = 0
+        infos = self.export.client.product_cache.infos()
+        offers = self.export.run()
+        try:
+            for offer in offers:
+                if self.cancelled:
+                    break
+                self.messages.put((ROW, offer.get('offerId'), article_row(offer, infos.get(offer.get('ean')))))
+                count += 1
+        except Exception as e:
+            self.messages.put((ERROR, e))
+            return
+        finally:
+            offers.close()
+        self.messages.put((CANCELLED if self.cancelled else DONE, count))
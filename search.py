@@ -0,0 +1,128 @@
+"""
+In-memory search index for the dashboard tabs.
+
+Rows are lowercased once when they are added. Their text is kept in blocks,
+each joined into one string, so a query is a handful of str.find calls per
+block instead of a Python-level loop over every value of every row.
+"""
+
+import threading
+from bisect import bisect_right
+
+_BLOCK_SIZE = 1024
+
+
+class _Block(object):
+    __slots__ = ('keys', 'texts', 'blob', 'starts')
+
+    def __init__(self):
+        self.keys = []
+        self.texts = []
+        self.blob = None
+        self.starts = None
+
+    def compile(self):
+        """Join the texts into one string, remembering where every row starts."""
+
+        if self.blob is None:
+            starts = []
+            offset = 0
+            for text in self.texts:
+                starts.append(offset)
+                offset += len(text) + 1
+            self.starts = starts
+            self.blob = "\n".join(self.texts)
+        return self.blob, self.starts
+
+
+def row_text(values):
+    return "\t".join("" if value is None else str(value) for value in values).lower()
+
+
+def query_terms(query):
+    return query.lower().split()
+
+
+def matches(terms, values):
+    """Tell whether a row contains every term, the rule SearchIndex.search() applies."""
+
+    text = row_text(values)
+    return all(term in text for term in terms)
+
+
+class SearchIndex(object):
+    """Substring index over rows, keyed by a stable row key.
+
+    A query matches the rows that contain every whitespace separated term of
+    it, case-insensitively, in any of their values.
+    """
+
+    def __init__(self, items=()):
+        self._blocks = []
+        self._where = {}
+        self._lock = threading.Lock()
+        self.add_many(items)
+
+    def __len__(self):
+        return len(self._where)
+
+    def add(self, key, values):
+        """Add a row, or replace the row that has the same key."""
+
+        self.add_many([(key, values)])
+
+    def add_many(self, items):
+        with self._lock:
+            for key, values in items:
+                text = row_text(values)
+                where = self._where.get(key)
+                if where is not None:
+                    block, position = where
+                    block.texts[position] = text
+                else:
+                    if not self._blocks or len(self._blocks[-1].keys) >= _BLOCK_SIZE:
+                        self._blocks.append(_Block())
+                    block = self._blocks[-1]
+                    self._where[key] = (block, len(block.keys))
+                    block.keys.append(key)
+                    block.texts.append(text)
+                block.blob = None
+
+    def remove(self, key):
+        with self._lock:
+            where = self._where.pop(key, None)
+            if where is not None:
+                block, position = where
+                block.keys[position] = None
+                block.texts[position] = ""
+                block.blob = None
+
+    def search(self, query):
+        """Return the set of keys of the rows matching query."""
+
+        terms = query_terms(query)
+        if not terms:
+            return set(self._where)
+        first, rest = terms[0], terms[1:]
+
+        found = set()
+        with self._lock:
+            for block in self._blocks:
+                blob, starts = block.compile()
+                keys, texts = block.keys, block.texts
+                if blob.count(first) * 8 > len(texts):
+                    # common term: checking every row is cheaper than jumping between hits
+                    found.update(key for key, text in zip(keys, texts)
+                                 if first in text and all(term in text for term in rest))
+                    continue
+                index = blob.find(first)
+                while index != -1:
+                    position = bisect_right(starts, index) - 1
+                    if all(term in texts[position] for term in rest):
+                        found.add(keys[position])
+                    # continue at the next row, one hit per row is enough
+                    if position + 1 >= len(starts):
+                        break
+                    index = blob.find(first, starts[position + 1])
+        found.discard(None)
+        return found
@@ -0,0 +1,102 @@
+"""
+Bulk shipment submission.
+"""
+
+from client import is_problem
+from process_status import PENDING, SUCCESS, ProcessStatusTracker
+
+
+class ShipmentSummary(object):
+    """Outcome of a shipment batch, as lists of orderItemIds."""
+
+    def __init__(self):
+        self.succeeded = []
+        self.failed = []
+        self.pending = []
+        self.errors = {}
+
+    def as_dict(self):
+        return {
+            'succeeded': self.succeeded,
+            'failed': self.failed,
+            'pending': self.pending,
+            'errors': self.errors,
+        }
+
+    def __repr__(self):
+        return "<ShipmentSummary succeeded=%d failed=%d pending=%d>" % (
+            len(self.succeeded), len(self.failed), len(self.pending))
+
+
+class ShipmentQueue(object):
+    """Collects order items to ship and submits them as multi-item shipments.
+
+    Items with the same order, transporter, track & trace code and shipment
+    reference go out in one shipment request. The resulting process statuses
+    are resolved in bulk by a ProcessStatusTracker.
+    """
+
+    def __init__(self, client, max_items=100, tracker=None):
+        """max_items caps the number of order items per shipment request."""
+
+        self.client = client
+        self.max_items = max_items
+        self.tracker = tracker if tracker is not None else ProcessStatusTracker(client)
+        self._groups = {}
+        self._submitted = {}
+
+    def add(self, orderItemId, trackAndTrace=None, transporterCode="TNT", quantity=None, orderId=None,
+            shipmentReference=None):
+        """Queue an order item; quantity ships part of the item, orderId keeps orders apart."""
+
+        key = (orderId, transporterCode, trackAndTrace, shipmentReference)
+        item = orderItemId if quantity is None else (orderItemId, quantity)
+        self._groups.setdefault(key, []).append(item)
+
+    def __len__(self):
+        return sum(len(items) for items in self._groups.values())
+
+    def submit(self, summary=None):
+        """Send all queued items, returning the summary of items that failed straight away.
+
+        Items leave the queue once their request returned, so if a request
+        raises, the items that weren't sent yet stay queued for the next submit.
+        """
+
+        summary = summary if summary is not None else ShipmentSummary()
+        for key in list(self._groups):
+            orderId, transporterCode, trackAndTrace, shipmentReference = key
+            items = self._groups[key]
+            while items:
+                chunk = items[:self.max_items]
+                item_ids = [str(item[0]) if isinstance(item, tuple) else str(item) for item in chunk]
+                response = self.client._ship_order_items(chunk, trackAndTrace, transporterCode, shipmentReference)
+                del items[:len(chunk)]
+                if not items:
+                    del self._groups[key]
+                if is_problem(response) or 'processStatusId' not in response:
+                    summary.failed.extend(item_ids)
+                    for item_id in item_ids:
+                        summary.errors[item_id] = response.get('detail') or response.get('title')
+                    continue
+                self._submitted[self.tracker.add(response)] = item_ids
+        return summary
+
+    def run(self, timeout=None):
+        """Submit everything queued and wait for the process statuses to resolve."""
+
+        summary = self.submit()
+        self.tracker.wait(timeout)
+        for process_status_id, item_ids in self._submitted.items():
+            status = self.tracker.forget(process_status_id)
+            state = status.get('status')
+            if state == SUCCESS:
+                summary.succeeded.extend(item_ids)
+            elif state == PENDING:
+                summary.pending.extend(item_ids)
+            else:
+                summary.failed.extend(item_ids)
+                for item_id in item_ids:
+                    summary.errors[item_id] = status.get('errorMessage') or state
+        self._submitted = {}
+        return summary
@@ -0,0 +1,61 @@
+"""
+Startup timing, to see where the time goes before the dashboard is usable.
+"""
+
+import time
+from contextlib import contextmanager
+
+
+class StartupProfile(object):
+    """Records how long each startup phase took.
+
+    The dashboard records import, login, widgets, local_load and
+    first_network; window_shown is the time from the start until the window
+    was mapped.
+    """
+
+    def __init__(self, started=None):
+        self.started = time.perf_counter() if started is None else started
+        self.phases = {}
+        self._open = {}
+
+    def record(self, phase, started, stopped=None):
+        """Record a phase that ran from started to stopped (perf_counter values)."""
+
+        if stopped is None:
+            stopped = time.perf_counter()
+        self.phases[phase] = stopped - started
+
+    def start(self, phase):
+        if phase not in self.phases:
+            self._open.setdefault(phase, time.perf_counter())
+
+    def stop(self, phase):
+        started = self._open.pop(phase, None)
+        if started is not None:
+            self.record(phase, started)
+
+    @contextmanager
+    def phase(self, phase):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(phase, started)
+
+    def mark(self, name):
+        """Record the time since the start, once."""
+
+        if name not in self.phases:
+            self.record(name, self.started)
+
+    def report(self):
+        """Return the recorded phases in seconds, in the order they were recorded."""
+
+        return dict(self.phases)
+
+    def format(self):
+        lines = ["Startup profile:"]
+        for phase, seconds in self.phases.items():
+            lines.append("  %-14s %8.1f ms" % (phase, seconds * 1000))
+        return "\n".join(lines)
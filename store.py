@@ -0,0 +1,322 @@
+"""
+Local order storage, an indexed SQLite database replacing the linear orders.csv scans.
+"""
+
+import codecs
+import csv
+import sqlite3
+import threading
+
+from models import OrderLine
+
+try:
+    codecs.lookup("ANSI")
+    CSV_ENCODING = "ANSI"
+except LookupError:  # "ANSI" is only known on Windows
+    CSV_ENCODING = "cp1252"
+
+CSV_HEADER = ["OrderID", "BestelDatum", "EanNummer", "Aantal", "Product", "Merk", "Verzendmethode",
+              "Customer Name", "Customer Address", "City", "Postal Code", "Country"]
+
+# status of an order item: in bol's OPEN order list, or gone from it (shipped or cancelled)
+OPEN = "OPEN"
+CLOSED = "CLOSED"
+
+_COLUMNS = ["order_id", "order_date", "ean", "quantity", "product", "brand", "fulfilment_method",
+            "customer_name", "customer_address", "city", "postal_code", "country"]
+
+# an upsert keeps the rowid, and with it the position of an updated row
+# seq is only set on insert: it numbers the items in the order they were first stored
+_UPSERT_SQL = "INSERT INTO order_items (order_item_id, %s, status, latest_change, account, seq) VALUES (?, %s, '%s', ?, ?, ?) " \
+              "ON CONFLICT (order_item_id) DO UPDATE SET %s" % (
+    ", ".join(_COLUMNS), ", ".join("?" * len(_COLUMNS)), OPEN,
+    ", ".join("%s = excluded.%s" % (c, c) for c in _COLUMNS + ["status", "latest_change", "account"]))
+
+
+def legacy_key(row):
+    """Key for rows imported from orders.csv, which has no orderItemId.
+
+    Real orderItemIds are numeric, so the colon tells the two apart.
+    """
+
+    return "%s:%s" % (row[0], row[2])
+
+
+class OrderStore(object):
+    """Order items keyed by orderItemId, indexed on orderId, EAN and order date.
+
+    Rows use the same 12-column layout as the orders Treeview and orders.csv.
+    Every item also has a status, OPEN or CLOSED, and the latestChangedDateTime
+    bol reported when it was stored. Methods taking open_only skip CLOSED items.
+    Items synced for one of several seller accounts are tagged with its name
+    (see accounts.py); the OPEN/CLOSED bookkeeping is per account, with None
+    for the untagged items of a single-account setup.
+    """
+
+    def __init__(self, path="orders.db"):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS order_items (
+                order_item_id TEXT PRIMARY KEY,
+                order_id TEXT NOT NULL,
+                order_date TEXT,
+                ean TEXT,
+                quantity INTEGER,
+                product TEXT,
+                brand TEXT,
+                fulfilment_method TEXT,
+                customer_name TEXT,
+                customer_address TEXT,
+                city TEXT,
+                postal_code TEXT,
+                country TEXT,
+                status TEXT NOT NULL DEFAULT 'OPEN',
+                latest_change TEXT,
+                account TEXT,
+                seq INTEGER
+            );
+            CREATE TABLE IF NOT EXISTS counters (
+                name TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
+            );
+        """)
+        # databases from before the status was kept
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(order_items)")}
+        if "status" not in columns:
+            self._db.execute("ALTER TABLE order_items ADD COLUMN status TEXT NOT NULL DEFAULT 'OPEN'")
+        if "latest_change" not in columns:
+            self._db.execute("ALTER TABLE order_items ADD COLUMN latest_change TEXT")
+        if "account" not in columns:
+            self._db.execute("ALTER TABLE order_items ADD COLUMN account TEXT")
+        if "seq" not in columns:
+            self._db.execute("ALTER TABLE order_items ADD COLUMN seq INTEGER")
+            self._db.execute("UPDATE order_items SET seq = rowid")
+        # unlike MAX(seq) or the rowid, the counter never hands out a number twice
+        self._db.execute("INSERT OR IGNORE INTO counters VALUES ('seq', (SELECT IFNULL(MAX(seq), 0) FROM order_items))")
+        self._db.executescript("""
+            CREATE INDEX IF NOT EXISTS order_items_order_id ON order_items (order_id);
+            CREATE INDEX IF NOT EXISTS order_items_ean ON order_items (ean);
+            CREATE INDEX IF NOT EXISTS order_items_order_date ON order_items (order_date);
+            CREATE INDEX IF NOT EXISTS order_items_status ON order_items (status, account);
+            CREATE INDEX IF NOT EXISTS order_items_seq ON order_items (seq);
+        """)
+        self._db.commit()
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            return self._db.execute(sql, params).fetchall()
+
+    def upsert(self, order_item_id, row):
+        """Insert or update a single order item."""
+
+        self.upsert_many([(order_item_id, row)])
+
+    def upsert_many(self, items, latest_changes=None, account=None):
+        """Insert or update (orderItemId, row) pairs in one transaction, returning the count.
+
+        The items become OPEN items of account; latest_changes maps
+        orderItemIds to their latestChangedDateTime.
+        """
+
+        count = 0
+        with self._lock, self._db:
+            seq = self._db.execute("SELECT value FROM counters WHERE name = 'seq'").fetchone()[0]
+            for order_item_id, row in items:
+                latest_change = None
+                if order_item_id is None:
+                    order_item_id = legacy_key(row)
+                else:
+                    # replace the row imported from orders.csv for this item, if any
+                    self._db.execute("DELETE FROM order_items WHERE order_item_id = ?", (legacy_key(row),))
+                    if latest_changes:
+                        latest_change = latest_changes.get(order_item_id)
+                seq += 1
+                self._db.execute(_UPSERT_SQL, [str(order_item_id)] + list(row[:len(_COLUMNS)]) + [latest_change, account, seq])
+                count += 1
+            self._db.execute("UPDATE counters SET value = ? WHERE name = 'seq'", (seq,))
+        return count
+
+    def open_items(self, account=None):
+        """Return {orderItemId: latest change} for the OPEN items of account."""
+
+        return dict(self._query("SELECT order_item_id, latest_change FROM order_items WHERE status = ? AND account IS ?",
+                                (OPEN, account)))
+
+    def mark_closed(self, open_item_ids, account=None):
+        """Mark the OPEN items of account that are not in open_item_ids as CLOSED, returning how many were."""
+
+        with self._lock, self._db:
+            self._db.execute("CREATE TEMP TABLE IF NOT EXISTS still_open (order_item_id TEXT PRIMARY KEY)")
+            self._db.execute("DELETE FROM still_open")
+            self._db.executemany("INSERT OR IGNORE INTO still_open VALUES (?)", ((str(i),) for i in open_item_ids))
+            closed = self._db.execute(
+                "UPDATE order_items SET status = ? WHERE status = ? AND account IS ? "
+                "AND order_item_id NOT IN (SELECT order_item_id FROM still_open)", (CLOSED, OPEN, account)).rowcount
+            self._db.execute("DELETE FROM still_open")
+        return closed
+
+    def status(self, order_item_id):
+        rows = self._query("SELECT status FROM order_items WHERE order_item_id = ?", (str(order_item_id),))
+        return rows[0][0] if rows else None
+
+    def account(self, order_item_id):
+        rows = self._query("SELECT account FROM order_items WHERE order_item_id = ?", (str(order_item_id),))
+        return rows[0][0] if rows else None
+
+    def accounts(self):
+        """Return {account: number of OPEN items}."""
+
+        return dict(self._query("SELECT account, COUNT(*) FROM order_items WHERE status = ? GROUP BY account", (OPEN,)))
+
+    def delete(self, order_item_id):
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM order_items WHERE order_item_id = ?", (str(order_item_id),))
+
+    def count(self, open_only=False):
+        return self._query("SELECT COUNT(*) FROM order_items" + self._where(open_only))[0][0]
+
+    def has_order(self, order_id):
+        return bool(self._query("SELECT 1 FROM order_items WHERE order_id = ? LIMIT 1", (str(order_id),)))
+
+    def has_item(self, order_item_id):
+        return bool(self._query("SELECT 1 FROM order_items WHERE order_item_id = ?", (str(order_item_id),)))
+
+    def order_ids(self):
+        return {row[0] for row in self._query("SELECT DISTINCT order_id FROM order_items")}
+
+    def get_item(self, order_item_id):
+        """Return the row of an order item, or None."""
+
+        rows = self._query("SELECT %s FROM order_items WHERE order_item_id = ?" % ", ".join(_COLUMNS), (str(order_item_id),))
+        return list(rows[0]) if rows else None
+
+    def items_for_order(self, order_id):
+        return [list(row) for row in self._query(
+            "SELECT %s FROM order_items WHERE order_id = ? ORDER BY rowid" % ", ".join(_COLUMNS), (str(order_id),))]
+
+    def items_for_ean(self, ean):
+        return [list(row) for row in self._query(
+            "SELECT %s FROM order_items WHERE ean = ? ORDER BY order_date" % ", ".join(_COLUMNS), (str(ean),))]
+
+    def items_between(self, start, end):
+        """Return the rows with start <= order date < end (ISO 8601 strings)."""
+
+        return [list(row) for row in self._query(
+            "SELECT %s FROM order_items WHERE order_date >= ? AND order_date < ? ORDER BY order_date" % ", ".join(_COLUMNS),
+            (start, end))]
+
+    def _where(self, open_only, condition=None):
+        conditions = [condition] if condition else []
+        if open_only:
+            conditions.append("status = '%s'" % OPEN)
+        # a condition may contain OR, which binds looser than the AND between them
+        return " WHERE " + " AND ".join("(%s)" % condition for condition in conditions) if conditions else ""
+
+    def _order_clause(self, order_by, descending):
+        direction = "DESC" if descending else "ASC"
+        if order_by is None:
+            return "rowid " + direction
+        return "%s %s, rowid %s" % (_COLUMNS[order_by], direction, direction)
+
+    def rows(self, offset=0, limit=-1, order_by=None, descending=False, open_only=False):
+        """Return a window of rows, in insertion order or sorted on column index order_by."""
+
+        return [list(row) for row in self._query(
+            "SELECT %s FROM order_items%s ORDER BY %s LIMIT ? OFFSET ?" % (
+                ", ".join(_COLUMNS), self._where(open_only), self._order_clause(order_by, descending)),
+            (limit, offset))]
+
+    def item_ids(self, order_by=None, descending=False, open_only=False):
+        """Return every orderItemId in the order of rows(order_by=..., descending=...)."""
+
+        return [row[0] for row in self._query(
+            "SELECT order_item_id FROM order_items%s ORDER BY %s" % (
+                self._where(open_only), self._order_clause(order_by, descending)))]
+
+    def item_ids_for_order(self, order_id):
+        return [row[0] for row in self._query(
+            "SELECT order_item_id FROM order_items WHERE order_id = ? ORDER BY rowid", (str(order_id),))]
+
+    def rows_for_items(self, order_item_ids):
+        """Return the rows of the given orderItemIds, in the same order."""
+
+        order_item_ids = [str(i) for i in order_item_ids]
+        found = {}
+        for start in range(0, len(order_item_ids), 500):
+            chunk = order_item_ids[start:start + 500]
+            for row in self._query(
+                    "SELECT order_item_id, %s FROM order_items WHERE order_item_id IN (%s)" % (
+                        ", ".join(_COLUMNS), ", ".join("?" * len(chunk))), chunk):
+                found[row[0]] = list(row[1:])
+        return [found[i] for i in order_item_ids if i in found]
+
+    def iter_items(self, batch_size=1000):
+        """Yield (orderItemId, row) for every order item, reading batch_size rows at a time."""
+
+        last = 0
+        while True:
+            batch = self._query(
+                "SELECT rowid, order_item_id, %s FROM order_items WHERE rowid > ? ORDER BY rowid LIMIT ?" % ", ".join(_COLUMNS),
+                (last, batch_size))
+            for row in batch:
+                yield row[1], list(row[2:])
+            if len(batch) < batch_size:
+                return
+            last = batch[-1][0]
+
+    def items_after(self, seq=0, limit=1000):
+        """Return up to limit (seq, orderItemId, account, row) first stored after seq, in that order.
+
+        seq numbers are never reused, also not when an item replaces its row
+        imported from orders.csv. Those imported rows have no orderItemId and
+        are left out.
+        """
+
+        return [(row[0], row[1], row[2], list(row[3:])) for row in self._query(
+            "SELECT seq, order_item_id, account, %s FROM order_items WHERE seq > ? AND order_item_id NOT LIKE '%%:%%' "
+            "ORDER BY seq LIMIT ?" % ", ".join(_COLUMNS), (seq, limit))]
+
+    def position(self, order_id, order_by=None, descending=False, open_only=False):
+        """Return the index of the first item of order_id in rows(order_by=..., ...), or None."""
+
+        found = self._query(
+            "SELECT rowid, %s FROM order_items%s ORDER BY %s LIMIT 1" % (
+                _COLUMNS[order_by or 0], self._where(open_only, "order_id = ?"), self._order_clause(order_by, descending)),
+            (str(order_id),))
+        if not found:
+            return None
+        rowid, value = found[0]
+        compare = ">" if descending else "<"
+        column = _COLUMNS[order_by or 0]
+        if order_by is None:
+            sql, params = "rowid %s ?" % compare, (rowid,)
+        elif value is None:
+            # SQLite sorts NULL first, so last when descending; a row value comparison skips NULLs
+            sql, params = "%s IS NULL AND rowid %s ?" % (column, compare), (rowid,)
+            if descending:
+                sql = "%s IS NOT NULL OR (%s)" % (column, sql)
+        else:
+            sql, params = "(%s, rowid) %s (?, ?)" % (column, compare), (value, rowid)
+            if not descending:
+                sql = "%s IS NULL OR %s" % (column, sql)
+        return self._query("SELECT COUNT(*) FROM order_items" + self._where(open_only, sql), params)[0][0]
+
+    def import_csv(self, path="orders.csv", encoding=CSV_ENCODING):
+        """Import an existing orders.csv, returning the number of rows read."""
+
+        with open(path, "r", encoding=encoding, newline="") as csvfile:
+            reader = csv.reader(csvfile, delimiter=";")
+            next(reader, None)  # Skip header row
+            return self.upsert_many((None, OrderLine.from_csv(row).to_row()) for row in reader if row)
+
+    def export_csv(self, path="orders.csv", encoding=CSV_ENCODING):
+        """Write all rows to a ;-delimited CSV in the orders.csv layout, returning the count."""
+
+        rows = self.rows()
+        with open(path, "w", newline="", encoding=encoding) as output_file:
+            writer = csv.writer(output_file, delimiter=";")
+            writer.writerow(CSV_HEADER)
+            writer.writerows(rows)
+        return len(rows)
@@ -0,0 +1,155 @@
+"""
+Headless order sync: the dashboard's refresh without Tk, for servers and cron.
+
+    python sync.py --client-id ID --client-secret SECRET            # one run
+    python sync.py --client-id ID --client-secret SECRET --loop 300  # every 5 minutes
+
+Every run prints one line of JSON with its statistics.
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+from client import Client
+from delta import DeltaRefresh
+from enrich import _WARNINGS, OrderEnricher
+from export import OrderExport
+from store import OrderStore
+
+
+def _warn(key, ean):
+    print(_WARNINGS[key].format(ean), file=sys.stderr)  # stdout is for the run statistics
+
+
+class SyncEngine(object):
+    """Fetches the open orders, enriches the new ones and writes them to an OrderStore.
+
+    Items the store already has with the same latestChangedDateTime are
+    skipped, so they cost no order or product lookups (see delta.DeltaRefresh).
+    Items that left the OPEN list are marked CLOSED.
+    """
+
+    def __init__(self, client, store, enricher=None, batch_size=200, full=False, account=None, export=None):
+        """batch_size is the number of rows written to the store per transaction;
+        with full, every open item is enriched again. Items are stored for
+        account, see accounts.py. export, an export.OrderExport, gets every
+        batch as soon as it is stored."""
+
+        self.client = client
+        self.store = store
+        self.enricher = enricher if enricher is not None else OrderEnricher(client, warn=_warn)
+        self.batch_size = batch_size
+        self.full = full
+        self.account = account
+        self.export = export
+
+    def _api_calls(self):
+        requests = sum(group['requests'] for group in self.client.scheduler.stats().values())
+        return requests + self.client.tokens.logins
+
+    def run_once(self):
+        """Run one sync and return its statistics as a dict."""
+
+        stats = {
+            'started': datetime.now().isoformat(timespec='seconds'),
+            'orders_seen': 0,
+            'new_items': 0,
+            'changed_items': 0,
+            'stored_items': 0,
+            'closed_items': 0,
+            'exported_items': 0,
+            'api_calls': 0,
+            'wall_time': 0.0,
+        }
+        api_calls = self._api_calls()
+        started = time.perf_counter()
+        delta = DeltaRefresh(self.client, self.store, full=self.full, account=self.account)
+        batch = []
+        try:
+            for order_item_id, row in self.enricher.enrich(delta.orders(self.client.iter_orders())):
+                batch.append((order_item_id, row))
+                if len(batch) >= self.batch_size:
+                    stats['stored_items'] += self.store.upsert_many(batch, delta.seen, self.account)
+                    batch = []
+                    if self.export is not None:
+                        stats['exported_items'] += self.export.export(self.store)
+            stats['closed_items'] = delta.finish()
+        except Exception as e:
+            stats['error'] = str(e)
+        finally:
+            # ook bij een fout bewaren wat al binnen is
+            stats['stored_items'] += self.store.upsert_many(batch, delta.seen, self.account)
+            stats['orders_seen'] = delta.orders_seen
+            stats['new_items'] = delta.new_items
+            stats['changed_items'] = delta.changed_items
+            stats['api_calls'] = self._api_calls() - api_calls
+            if self.export is not None and 'error' not in stats:
+                stats['exported_items'] += self.export.export(self.store)
+            stats['wall_time'] = round(time.perf_counter() - started, 3)
+        return stats
+
+    def run_forever(self, interval, report=None):
+        """Sync every interval seconds, passing the statistics of each run to report."""
+
+        run_forever(self.run_once, interval, report)
+
+
+def run_forever(run_once, interval, report=None):
+    """Call run_once() every interval seconds, passing what it returns to report."""
+
+    while True:
+        started = time.monotonic()
+        stats = run_once()
+        if report is not None:
+            report(stats)
+        time.sleep(max(0.0, interval - (time.monotonic() - started)))
+
+
+def add_arguments(parser):
+    """Add the options shared by sync.py and accounts.py to an ArgumentParser."""
+
+    parser.add_argument("--db", default="orders.db", help="order store (default orders.db)")
+    parser.add_argument("--token-file", default="tokens.json", help="token cache (default tokens.json)")
+    parser.add_argument("--demo", action="store_true", help="use the demo environment")
+    parser.add_argument("--full", action="store_true", help="enrich every open item again, not only new and changed ones")
+    parser.add_argument("--loop", type=float, metavar="SECONDS",
+                        help="keep syncing every SECONDS instead of running once")
+    parser.add_argument("--export", metavar="DIR", help="also export new items to DIR, see export.py")
+
+
+def _print_stats(stats):
+    print(json.dumps(stats), flush=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sync open bol.com orders into the local order store.")
+    parser.add_argument("--client-id", default=os.environ.get("BOL_CLIENT_ID"),
+                        help="API client id, default $BOL_CLIENT_ID")
+    parser.add_argument("--client-secret", default=os.environ.get("BOL_CLIENT_SECRET"),
+                        help="API client secret, default $BOL_CLIENT_SECRET")
+    add_arguments(parser)
+    args = parser.parse_args(argv)
+    if not args.client_id or not args.client_secret:
+        parser.error("--client-id and --client-secret (or $BOL_CLIENT_ID and $BOL_CLIENT_SECRET) are required")
+
+    with contextlib.redirect_stdout(sys.stderr):
+        client = Client(args.client_id, args.client_secret, demo=args.demo, token_file=args.token_file, login=False)
+    export = OrderExport(args.export) if args.export else None
+    engine = SyncEngine(client, OrderStore(args.db), full=args.full, export=export)
+    if args.loop:
+        try:
+            engine.run_forever(args.loop, _print_stats)
+        except KeyboardInterrupt:
+            return 0
+    stats = engine.run_once()
+    _print_stats(stats)
+    return 1 if 'error' in stats else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,52 @@
+"""
+OrderExport against a real OrderStore in a temporary directory.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from export import JSONL, OrderExport, read
+from store import OrderStore
+
+
+def _row(order_id, ean):
+    return [order_id, "2024-05-19T10:00:00+02:00", ean, 1, "Product", "Merk", "VVB",
+            "N/A", "N/A", "N/A", "N/A", "N/A"]
+
+
+class OrderExportTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.store = OrderStore(":memory:")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def export(self):
+        return OrderExport(os.path.join(self.directory, "export"), formats=[JSONL], fsync=False)
+
+    def test_item_replacing_an_imported_row_is_exported_once(self):
+        # rows from orders.csv have no orderItemId; the item replacing the last one may get its rowid
+        self.store.upsert_many([(None, _row("1", "871")), (None, _row("2", "872"))])
+        self.assertEqual(self.export().export(self.store), 0)
+        self.store.upsert("900", _row("2", "872"))
+        self.assertEqual(self.export().export(self.store), 1)
+        self.assertEqual([record['order_item_id'] for record in read(os.path.join(self.directory, "export"))], ["900"])
+
+    def test_interrupted_export_is_cut_back(self):
+        self.store.upsert("900", _row("1", "871"))
+        export = self.export()
+        export.export(self.store)
+        path = os.path.join(self.directory, "export", "2024-05", "orders-2024-05-19.jsonl")
+        with open(path, "a") as f:
+            f.write('{"order_item_id": "901", "acc')
+        self.store.upsert("901", _row("2", "872"))
+        self.assertEqual(self.export().export(self.store), 1)
+        self.assertEqual([record['order_item_id'] for record in read(os.path.join(self.directory, "export"))],
+                         ["900", "901"])
+
+
+if __name__ == "__main__":
+    unittest.main()
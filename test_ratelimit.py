@@ -0,0 +1,41 @@
+"""
+RequestScheduler.retry_delay, the retry rules both clients follow.
+"""
+
+import unittest
+
+from ratelimit import RequestScheduler
+
+
+class RetryDelayTest(unittest.TestCase):
+    def setUp(self):
+        self.scheduler = RequestScheduler(max_retries=2, backoff=0.01)
+
+    def test_success_is_final(self):
+        self.assertIsNone(self.scheduler.retry_delay('GET', "orders", 0, 200, {}))
+        self.assertIsNone(self.scheduler.retry_delay('POST', "orders", 0, 404, {}))
+
+    def test_throttled_request_waits_for_the_bucket(self):
+        delay = self.scheduler.retry_delay('POST', "orders", 0, 429, {'Retry-After': "2"})
+        self.assertEqual(delay, 0.0)
+        self.assertGreater(self.scheduler.bucket("orders").reserve(), 1.0)
+        self.assertEqual(self.scheduler.stats()["orders"]['throttled'], 1)
+
+    def test_server_errors_only_retry_idempotent_requests(self):
+        self.assertIsNotNone(self.scheduler.retry_delay('GET', "orders", 0, 502, {}))
+        self.assertIsNone(self.scheduler.retry_delay('POST', "orders", 0, 502, {}))
+        self.assertIsNotNone(self.scheduler.retry_delay('POST', "orders", 0, 503, {}))
+
+    def test_connection_errors(self):
+        self.assertIsNotNone(self.scheduler.retry_delay('PUT', "orders", 0))
+        self.assertIsNone(self.scheduler.retry_delay('POST', "orders", 0))
+
+    def test_gives_up_after_max_retries(self):
+        self.assertIsNone(self.scheduler.retry_delay('GET', "orders", 2, 503, {}))
+        self.assertIsNone(self.scheduler.retry_delay('GET', "orders", 2))
+        stats = self.scheduler.stats()["orders"]
+        self.assertEqual((stats['errors'], stats['retries']), (2, 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,53 @@
+"""
+ShipmentQueue against a fake client: a request that raises must not drop the items not sent yet.
+"""
+
+import unittest
+
+from shipments import ShipmentQueue
+
+
+class _Client(object):
+    def __init__(self, fail_at=None):
+        self.fail_at = fail_at
+        self.shipped = []
+
+    def _ship_order_items(self, orderItems, trackAndTrace=None, transporterCode="TNT", shipmentReference=None):
+        if len(self.shipped) == self.fail_at:
+            self.fail_at = None
+            raise RuntimeError("Connection reset")
+        self.shipped.append(list(orderItems))
+        return {'processStatusId': str(len(self.shipped)), 'status': "PENDING"}
+
+
+class SubmitTest(unittest.TestCase):
+    def _queue(self, client):
+        queue = ShipmentQueue(client, max_items=2)
+        for index in range(5):
+            queue.add(str(5000 + index), trackAndTrace="3SBOL1", orderId="1000")
+        queue.add("6000", trackAndTrace="3SBOL2", orderId="1001")
+        return queue
+
+    def test_submit_sends_everything_in_chunks(self):
+        client = _Client()
+        queue = self._queue(client)
+        queue.submit()
+        self.assertEqual(client.shipped, [["5000", "5001"], ["5002", "5003"], ["5004"], ["6000"]])
+        self.assertEqual(len(queue), 0)
+
+    def test_failed_request_keeps_unsent_items_queued(self):
+        client = _Client(fail_at=1)
+        queue = self._queue(client)
+        with self.assertRaises(RuntimeError):
+            queue.submit()
+        self.assertEqual(client.shipped, [["5000", "5001"]])
+        self.assertEqual(len(queue), 4)
+
+        queue.submit()
+        self.assertEqual(client.shipped, [["5000", "5001"], ["5002", "5003"], ["5004"], ["6000"]])
+        self.assertEqual(len(queue), 0)
+        self.assertEqual(sorted(queue._submitted), ["1", "2", "3", "4"])
+
+
+if __name__ == "__main__":
+    unittest.main()
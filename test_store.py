@@ -0,0 +1,38 @@
+"""
+OrderStore queries that the virtual orders view relies on.
+"""
+
+import random
+import unittest
+
+from store import OrderStore
+
+
+class PositionTest(unittest.TestCase):
+    def setUp(self):
+        self.store = OrderStore(":memory:")
+        rng = random.Random(7)
+        items = []
+        for index in range(300):
+            date = rng.choice([None, "2024-05-18T10:00:00", "2024-05-19T10:00:00"])
+            title = rng.choice([None, "Lamp", "Stoel", "Tafel"])  # the enricher leaves missing titles as None
+            items.append((str(5000 + index), [str(1000 + index // 2), date, "871", 1, title, "Merk", "VVB",
+                                              "N/A", "N/A", "N/A", "N/A", "N/A"]))
+        self.store.upsert_many(items)
+        self.store.mark_closed([order_item_id for order_item_id, _ in items[::2]])
+
+    def test_position_matches_rows(self):
+        for open_only in (False, True):
+            for order_by in (None, 0, 1, 4):
+                for descending in (False, True):
+                    rows = self.store.rows(order_by=order_by, descending=descending, open_only=open_only)
+                    first = {}
+                    for index, row in enumerate(rows):
+                        first.setdefault(row[0], index)
+                    for order_id, index in first.items():
+                        self.assertEqual(self.store.position(order_id, order_by, descending, open_only), index,
+                                         (order_id, open_only, order_by, descending))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+"""
+SyncEngine against a fake client: a refresh that fails part-way must not close items.
+"""
+
+import unittest
+
+from cache import OrderCache
+from delta import DeltaRefresh
+from ratelimit import RequestScheduler
+from store import CLOSED, OPEN, OrderStore
+from sync import SyncEngine
+
+
+def _order(index):
+    return {'orderId': str(1000 + index), 'orderPlacedDateTime': "2024-05-19T21:00:00+02:00",
+            'orderItems': [{'orderItemId': str(5000 + index), 'ean': "871", 'quantity': 1,
+                            'latestChangedDateTime': "2024-05-19T21:00:00+02:00"}]}
+
+
+class _Tokens(object):
+    logins = 0
+
+
+class _Client(object):
+    def __init__(self, orders, fail_after=None):
+        self.orders = orders
+        self.fail_after = fail_after
+        self.scheduler = RequestScheduler()
+        self.tokens = _Tokens()
+        self.order_cache = OrderCache()
+
+    def iter_orders(self):
+        for index, order in enumerate(self.orders):
+            if index == self.fail_after:
+                raise RuntimeError("Orders page 2 failed: Service Unavailable")
+            yield order
+
+
+class _Enricher(object):
+    def enrich(self, orders):
+        for order in orders:
+            for item in order.items:
+                yield item.order_item_id, [order.order_id, order.placed, item.ean, item.quantity,
+                                           "Product", "Merk", "VVB", "N/A", "N/A", "N/A", "N/A", "N/A"]
+
+
+class SyncEngineTest(unittest.TestCase):
+    def setUp(self):
+        self.store = OrderStore(":memory:")
+        self.orders = [_order(i) for i in range(120)]
+        stats = SyncEngine(_Client(self.orders), self.store, enricher=_Enricher()).run_once()
+        self.assertEqual(stats['stored_items'], 120)
+
+    def test_failed_list_closes_nothing(self):
+        stats = SyncEngine(_Client(self.orders, fail_after=50), self.store, enricher=_Enricher()).run_once()
+        self.assertIn('error', stats)
+        self.assertEqual(stats['closed_items'], 0)
+        self.assertEqual(len(self.store.open_items()), 120)
+
+    def test_complete_list_closes_missing_items(self):
+        stats = SyncEngine(_Client(self.orders[:100]), self.store, enricher=_Enricher()).run_once()
+        self.assertNotIn('error', stats)
+        self.assertEqual(stats['closed_items'], 20)
+        self.assertEqual(self.store.status("5000"), OPEN)
+        self.assertEqual(self.store.status("5119"), CLOSED)
+
+    def test_partly_read_list_closes_nothing(self):
+        delta = DeltaRefresh(_Client(self.orders), self.store, full=True)
+        orders = delta.orders(self.orders)
+        for _ in range(50):  # a cancelled refresh stops reading here
+            next(orders, None)
+        self.assertEqual(delta.finish(), 0)
+        self.assertEqual(len(self.store.open_items()), 120)
+
+
+if __name__ == "__main__":
+    unittest.main()
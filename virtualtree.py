@@ -0,0 +1,353 @@
+"""
+Virtualized Treeview: only the visible rows exist as Tk items.
+
+The rows live in a model; the view asks it for the window it shows. Models
+implement __len__, rows(start, stop), sort(column, descending) and
+index_of(value), where index_of finds the first row whose first column is value.
+For searching they also implement items(), yielding (key, row) for every row,
+and set_filter(keys), which limits the rows shown to the given keys.
+"""
+
+import tkinter as tk
+from tkinter import ttk
+
+from store import legacy_key
+
+
+def _sort_key(column):
+    def key(row):
+        value = row[column]
+        try:
+            return (0, float(value), "")
+        except (TypeError, ValueError):
+            return (1, 0.0, "" if value is None else str(value).lower())
+    return key
+
+
+class ListModel(object):
+    """Rows held in memory, keyed by the position they were added at.
+
+    Sorting and filtering only reorder a list of positions, so keys stay valid.
+    """
+
+    def __init__(self, rows=None):
+        self.data = list(rows or [])
+        self.order = list(range(len(self.data)))
+        self.keys = None  # Alleen de rijen met deze posities tonen
+        self._filtered = []
+
+    def _visible(self):
+        if self.keys is None:
+            return self.order
+        return self._filtered
+
+    def __len__(self):
+        return len(self._visible())
+
+    def rows(self, start, stop):
+        return [self.data[i] for i in self._visible()[start:stop]]
+
+    def items(self):
+        return enumerate(self.data)
+
+    def append(self, row):
+        """Add a row, returning its key. A filtered model only shows it after set_filter()."""
+
+        self.data.append(row)
+        self.order.append(len(self.data) - 1)
+        return len(self.data) - 1
+
+    def extend(self, rows):
+        for row in rows:
+            self.append(row)
+
+    def clear(self):
+        del self.data[:]
+        del self.order[:]
+        if self.keys is not None:
+            self.set_filter(set())
+
+    def sort(self, column, descending=False):
+        key = _sort_key(column)
+        self.order.sort(key=lambda i: key(self.data[i]), reverse=descending)
+        if self.keys is not None:
+            self.set_filter(self.keys)
+
+    def set_filter(self, keys):
+        """Show only the rows whose key is in keys; None shows all rows."""
+
+        self.keys = keys
+        if keys is not None:
+            self._filtered = [i for i in self.order if i in keys]
+
+    def index_of(self, value):
+        value = str(value)
+        for index, position in enumerate(self._visible()):
+            if str(self.data[position][0]) == value:
+                return index
+        return None
+
+
+class StoreModel(object):
+    """Rows read on demand from an OrderStore, so nothing is loaded up front.
+
+    Keys are orderItemIds. With open_only, CLOSED items are left out. The
+    orderItemIds in view order are read once for filtering and kept until
+    the sort order or open_only changes, or refresh() is called; added()
+    updates them for newly stored items.
+    """
+
+    def __init__(self, store, open_only=False):
+        self.store = store
+        self.open_only = open_only
+        self.order_by = None
+        self.descending = False
+        self.keys = None
+        self._count = None
+        self._ids = None
+        self._all_ids = None
+        self._known = set()
+        self._window = (0, 0, [])
+
+    def refresh(self):
+        """Forget cached counts and rows after the store changed."""
+
+        self._count = None
+        self._all_ids = None
+        self._window = (0, 0, [])
+        if self.keys is not None:
+            self.set_filter(self.keys)
+
+    def added(self, items):
+        """Take in (orderItemId, row) pairs just written to the store, without rereading it.
+
+        The filter isn't applied to them; call set_filter() for that.
+        """
+
+        self._count = None
+        self._window = (0, 0, [])
+        if self._all_ids is None:
+            return
+        if self.order_by is not None:
+            # their place in a sorted view is only known to the store
+            self._all_ids = None
+            return
+        replaced = {legacy_key(row) for _, row in items}
+        if replaced & self._known:
+            self._all_ids = [i for i in self._all_ids if i not in replaced]
+            self._known -= replaced
+        new = []
+        for order_item_id, row in items:
+            order_item_id = legacy_key(row) if order_item_id is None else str(order_item_id)
+            if order_item_id not in self._known:
+                self._known.add(order_item_id)
+                new.append(order_item_id)
+        # an upsert keeps the rowid, so only new items move, to the end
+        self._all_ids = new[::-1] + self._all_ids if self.descending else self._all_ids + new
+
+    def _ordered_ids(self):
+        if self._all_ids is None:
+            self._all_ids = self.store.item_ids(self.order_by, self.descending, self.open_only)
+            self._known = set(self._all_ids)
+        return self._all_ids
+
+    def __len__(self):
+        if self.keys is not None:
+            return len(self._ids)
+        if self._count is None:
+            self._count = self.store.count(self.open_only)
+        return self._count
+
+    def _read(self, start, stop):
+        if self.keys is not None:
+            return self.store.rows_for_items(self._ids[start:stop])
+        return self.store.rows(start, stop - start, self.order_by, self.descending, self.open_only)
+
+    def rows(self, start, stop):
+        cached_start, cached_stop, cached = self._window
+        if cached_start <= start and stop <= cached_stop:
+            return cached[start - cached_start:stop - cached_start]
+        # read a few screens at once, so scrolling doesn't query on every step
+        margin = stop - start
+        window_start = max(0, start - margin)
+        rows = self._read(window_start, stop + margin)
+        self._window = (window_start, window_start + len(rows), rows)
+        return rows[start - window_start:stop - window_start]
+
+    def items(self):
+        return self.store.iter_items()
+
+    def sort(self, column, descending=False):
+        self.order_by = column
+        self.descending = descending
+        self.refresh()
+
+    def set_open_only(self, open_only):
+        self.open_only = open_only
+        self.refresh()
+
+    def set_filter(self, keys):
+        """Show only the order items in keys; None shows all rows."""
+
+        self.keys = keys
+        self._window = (0, 0, [])
+        if keys is None:
+            self._ids = None
+        else:
+            self._ids = [i for i in self._ordered_ids() if i in keys]
+
+    def index_of(self, value):
+        if self.keys is None:
+            return self.store.position(value, self.order_by, self.descending, self.open_only)
+        wanted = set(self.store.item_ids_for_order(value))
+        for index, order_item_id in enumerate(self._ids):
+            if order_item_id in wanted:
+                return index
+        return None
+
+
+class VirtualTreeview(ttk.Frame):
+    """A ttk.Treeview with a scrollbar that only materializes the visible rows.
+
+    Accepts the same column options as ttk.Treeview and forwards heading,
+    bind, selection, item and tag_configure to it. Clicking a heading sorts
+    the model on that column; clicking it again reverses the order.
+    """
+
+    def __init__(self, master, model, columns, **kwargs):
+        super().__init__(master)
+        self.model = model
+        self.columns = columns
+        self.first = 0
+        self.sort_column = None
+        self.sort_descending = False
+        self.row_tags = None  # Optioneel: functie (index, row) -> tags
+        self._items = []
+        self._selected = None
+
+        self.tree = ttk.Treeview(self, columns=columns, **kwargs)
+        self.scrollbar = ttk.Scrollbar(self, orient=tk.VERTICAL, command=self.yview)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+
+        for index, column in enumerate(columns):
+            self.tree.heading(column, command=lambda index=index: self.sort_by(index))
+
+        self.tree.bind("<Configure>", lambda event: self.refresh())
+        self.tree.bind("<MouseWheel>", self._on_mousewheel)
+        self.tree.bind("<Button-4>", lambda event: self.scroll(-3))
+        self.tree.bind("<Button-5>", lambda event: self.scroll(3))
+        self.tree.bind("<Prior>", lambda event: self._scroll_key(-self.visible_rows()))
+        self.tree.bind("<Next>", lambda event: self._scroll_key(self.visible_rows()))
+        self.tree.bind("<Home>", lambda event: self._scroll_key(-len(self.model)))
+        self.tree.bind("<End>", lambda event: self._scroll_key(len(self.model)))
+        self.tree.bind("<<TreeviewSelect>>", self._on_select, add="+")
+
+    def heading(self, column, **kwargs):
+        return self.tree.heading(column, **kwargs)
+
+    def bind(self, sequence=None, func=None, add=None):
+        return self.tree.bind(sequence, func, add)
+
+    def selection(self):
+        return self.tree.selection()
+
+    def item(self, item, option=None, **kwargs):
+        return self.tree.item(item, option, **kwargs)
+
+    def tag_configure(self, tagname, **kwargs):
+        return self.tree.tag_configure(tagname, **kwargs)
+
+    def visible_rows(self):
+        """Number of rows that fit in the current height of the tree."""
+
+        rowheight = int(ttk.Style().lookup("Treeview", "rowheight") or 20)
+        height = self.tree.winfo_height()
+        if height <= 1:  # Nog niet getekend
+            return int(self.tree.cget("height"))
+        return max(1, (height - rowheight) // rowheight)
+
+    def refresh(self):
+        """Show the rows from self.first on, reusing the existing Tk items."""
+
+        count = len(self.model)
+        visible = self.visible_rows()
+        self.first = max(0, min(self.first, count - visible))
+        rows = self.model.rows(self.first, self.first + visible)
+
+        while len(self._items) < len(rows):
+            self._items.append(self.tree.insert("", tk.END))
+        while len(self._items) > len(rows):
+            self.tree.delete(self._items.pop())
+
+        selected = []
+        for offset, (item, row) in enumerate(zip(self._items, rows)):
+            index = self.first + offset
+            tags = self.row_tags(index, row) if self.row_tags else ()
+            self.tree.item(item, values=row, tags=tags)
+            if index == self._selected:
+                selected.append(item)
+        self.tree.selection_set(selected)
+
+        if count:
+            self.scrollbar.set(self.first / count, min(1.0, (self.first + visible) / count))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+    def scroll(self, rows):
+        self.first += rows
+        self.refresh()
+
+    def see(self, index):
+        """Scroll so row index is visible and select it."""
+
+        visible = self.visible_rows()
+        if index < self.first or index >= self.first + visible:
+            self.first = max(0, index - visible // 2)
+        self._selected = index
+        self.refresh()
+
+    def see_value(self, value):
+        """Jump to the first row whose first column equals value; returns False if there is none."""
+
+        index = self.model.index_of(value)
+        if index is None:
+            return False
+        self.see(index)
+        return True
+
+    def sort_by(self, column):
+        if self.sort_column == column:
+            self.sort_descending = not self.sort_descending
+        else:
+            self.sort_column = column
+            self.sort_descending = False
+        self.model.sort(column, self.sort_descending)
+        self._selected = None
+        self.first = 0
+        self.refresh()
+
+    def yview(self, *args):
+        """Scrollbar callback."""
+
+        count = len(self.model)
+        if args[0] == "moveto":
+            self.first = int(float(args[1]) * count)
+        elif args[0] == "scroll":
+            amount = int(args[1])
+            if args[2] == "pages":
+                amount *= self.visible_rows()
+            self.first += amount
+        self.refresh()
+
+    def _on_mousewheel(self, event):
+        self.scroll(-3 if event.delta > 0 else 3)
+
+    def _scroll_key(self, rows):
+        self.scroll(rows)
+        return "break"
+
+    def _on_select(self, event):
+        selection = self.tree.selection()
+        if selection and selection[0] in self._items:
+            self._selected = self.first + self._items.index(selection[0])